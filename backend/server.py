@@ -1,35 +1,177 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import re
+import math
+import random
+import time
+import gzip
+import base64
+import asyncio
+import difflib
+import heapq
+import bisect
+import hashlib
+import hmac
 import logging
+import unicodedata
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Awaitable, Callable, List, NamedTuple, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import json
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
+# The client and its connection pool are created per worker process in the app
+# lifespan (see create_app); sizes are per worker, so total connections scale with workers
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI()
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+client: Optional[AsyncIOMotorClient] = None
+db = None
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Metrics
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_labels(label_name: Optional[str], label: Optional[str]) -> str:
+    return f'{{{label_name}="{label}"}}' if label_name else ""
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_name: Optional[str] = None,
+                 buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_name = label_name
+        self.buckets = buckets
+        # label -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict = {}
+
+    def observe(self, value: float, label: Optional[str] = None):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label, (counts, total, count) in self._series.items():
+            prefix = f'{self.label_name}="{label}",' if self.label_name else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{format_labels(self.label_name, label)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_name, label)} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, description: str, label_name: Optional[str] = None):
+        self.name = name
+        self.description = description
+        self.label_name = label_name
+        self._values: dict = {}
+
+    def inc(self, label: Optional[str] = None, amount: float = 1):
+        self._values[label] = self._values.get(label, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{format_labels(self.label_name, label)} {value}" for label, value in self._values.items())
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+REQUEST_SECONDS = Histogram("kisan_vani_request_seconds", "HTTP request latency by endpoint", "endpoint")
+LLM_CALL_SECONDS = Histogram("kisan_vani_llm_call_seconds", "Upstream LLM call latency")
+MONGO_INSERT_SECONDS = Histogram("kisan_vani_mongo_insert_seconds", "Batched chat message insert latency")
+HISTORY_QUERY_SECONDS = Histogram("kisan_vani_history_query_seconds", "Chat history query latency")
+UPSTREAM_ERRORS = Counter("kisan_vani_upstream_errors_total", "Failed upstream LLM calls")
+FALLBACK_RESPONSES_SERVED = Counter("kisan_vani_fallback_responses_total", "Apology responses served instead of an answer")
+ANSWERS = Counter("kisan_vani_answers_total", "Answers served by source", "source")
+REQUESTS_IN_FLIGHT = Gauge("kisan_vani_requests_in_flight", "HTTP requests currently being processed")
+LLM_BREAKER_OPEN = Gauge("kisan_vani_llm_breaker_open", "1 while the LLM circuit breaker is open or probing")
+METRICS = [REQUEST_SECONDS, LLM_CALL_SECONDS, MONGO_INSERT_SECONDS, HISTORY_QUERY_SECONDS,
+           UPSTREAM_ERRORS, FALLBACK_RESPONSES_SERVED, ANSWERS, REQUESTS_IN_FLIGHT, LLM_BREAKER_OPEN]
+
+# Per-request stage durations for the Server-Timing header; None when disabled
+request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+def observe_stage(stage: str, histogram: Histogram, seconds: float):
+    histogram.observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: no request/response objects, so the per-request cost is
+    # a couple of perf_counter calls, a bisect and a contextvar set
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = {} if SERVER_TIMING_ENABLED else None
+        token = request_timings.set(timings)
+        REQUESTS_IN_FLIGHT.value += 1
+
+        async def send_with_timing(message):
+            if timings is not None and message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - started
+                header = ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.value -= 1
+            endpoint = scope.get("endpoint")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, getattr(endpoint, "__name__", "unmatched"))
+            request_timings.reset(token)
+
 # Agricultural Knowledge Base
-AGRICULTURAL_KNOWLEDGE = """
+KISAN_VANI_PERSONA = """
 You are Kisan Vani (കിസാൻ വാണി), an AI assistant for farmers. You provide accurate, helpful information about:
+"""
 
+KNOWLEDGE_SECTIONS = """
 GOVERNMENT SCHEMES / സർക്കാർ പദ്ധതികൾ:
 - PM-KISAN: ₹6,000 per year for small farmers (₹2,000 every 4 months) / PM-കിസാൻ: ചെറുകിസാൻമാർക്ക് വർഷം ₹6,000 (4 മാസത്തിലൊരിക്കൽ ₹2,000)
 - PMFBY: Crop insurance scheme with 50% premium support for small farmers / വിള ഇൻഷുറൻസ് പദ്ധതി - ചെറുകിസാൻമാർക്ക് 50% പ്രീമിയം സഹായം
@@ -55,7 +197,9 @@ FERTILIZER RECOMMENDATIONS / വള ശുപാർശകൾ:
 - Organic fertilizers / ജൈവവളങ്ങൾ: Compost/കമ്പോസ്റ്റ്, vermicompost/കേഴുവളം, green manure/പച്ചിലവളം
 - NPK ratios based on crop needs / വിളയുടെ ആവശ്യമനുസരിച്ച് NPK അനുപാതം
 
-IMPORTANT LANGUAGE INSTRUCTIONS:
+"""
+
+LANGUAGE_GUIDELINES = """IMPORTANT LANGUAGE INSTRUCTIONS:
 - If the user asks in Malayalam, respond PRIMARILY in Malayalam with key English terms in brackets
 - If the user asks in English, respond in English with some Malayalam terms to help local understanding
 - Always be culturally appropriate for Kerala/South Indian farming context
@@ -65,20 +209,22 @@ IMPORTANT LANGUAGE INSTRUCTIONS:
 Always provide practical, actionable advice suitable for Indian farming conditions, especially Kerala context.
 """
 
-# Initialize LLM Chat
-async def get_ai_response(message: str, session_id: str, language: str = "english") -> str:
-    try:
-        # Enhanced language detection
-        contains_malayalam = any(char in message for char in 'അആഇഈഉഊഋഌഎഏഐഒഓഔകഖഗഘങചഛജഝടതഥദധനപഫബഭമയരലവശഷസഹളഴറ')
-        
-        # Force Malayalam response if Malayalam detected in message OR if language is set to Malayalam
-        use_malayalam = language.lower() == "malayalam" or contains_malayalam
-        
-        # Create system message based on language
-        system_message = AGRICULTURAL_KNOWLEDGE
-        
-        if use_malayalam:
-            system_message += """
+AGRICULTURAL_KNOWLEDGE = KISAN_VANI_PERSONA + KNOWLEDGE_SECTIONS + LANGUAGE_GUIDELINES
+
+# With retrieval on, the knowledge sections are indexed and only the relevant
+# chunks travel with each question instead of the whole base in the system prompt
+KNOWLEDGE_RETRIEVAL_ENABLED = os.environ.get('KNOWLEDGE_RETRIEVAL_ENABLED', 'true').lower() == 'true'
+KNOWLEDGE_TOP_K = int(os.environ.get('KNOWLEDGE_TOP_K', '4'))
+
+RETRIEVAL_PERSONA = """
+You are Kisan Vani (കിസാൻ വാണി), an AI assistant for farmers. You provide accurate, helpful information about government schemes, pest and disease management, crop diseases and fertilizers.
+Questions may come with reference notes from the Kisan Vani knowledge base. Base your answer on those notes where they apply.
+
+"""
+
+BASE_SYSTEM_PROMPT = RETRIEVAL_PERSONA + LANGUAGE_GUIDELINES if KNOWLEDGE_RETRIEVAL_ENABLED else AGRICULTURAL_KNOWLEDGE
+
+MALAYALAM_RESPONSE_INSTRUCTIONS = """
 
 CRITICAL INSTRUCTION FOR MALAYALAM RESPONSE:
 - You MUST respond ONLY in Malayalam language 
@@ -90,24 +236,1051 @@ CRITICAL INSTRUCTION FOR MALAYALAM RESPONSE:
 - Example format: "പിഎം-കിസാൻ പദ്ധതി എന്നത് ചെറുകർഷകർക്കുള്ള ഒരു സർക്കാർ പദ്ധതിയാണ്..."
 
 DO NOT MIX ENGLISH AND MALAYALAM - RESPOND ONLY IN MALAYALAM."""
+
+ENGLISH_RESPONSE_INSTRUCTIONS = "\n\nThe user is asking in English. Respond in English with some Malayalam terms in brackets to help with local understanding."
+
+# System prompts are built once instead of concatenated on every request
+SYSTEM_PROMPTS = {
+    "malayalam": BASE_SYSTEM_PROMPT + MALAYALAM_RESPONSE_INSTRUCTIONS,
+    "english": BASE_SYSTEM_PROMPT + ENGLISH_RESPONSE_INSTRUCTIONS
+}
+
+# Language routing
+# The whole Malayalam block: letters, vowel signs, virama, chillu letters and digits
+MALAYALAM_CHAR_PATTERN = re.compile(r"[\u0D00-\u0D7F]")
+LATIN_LETTER_PATTERN = re.compile(r"[A-Za-z]")
+# In UTF-8 every code point in U+0D00-U+0D7F starts with one of these byte pairs,
+# and 0xE0 is never a continuation byte, so counting the pairs counts the characters
+MALAYALAM_UTF8_PREFIXES = (b"\xe0\xb4", b"\xe0\xb5")
+# Translation table that deletes every byte except ASCII letters
+NON_LATIN_BYTES = bytes(b for b in range(256) if not (65 <= b <= 90 or 97 <= b <= 122))
+
+class LanguageDecision(NamedTuple):
+    language: str  # "malayalam" or "english"
+    confidence: float
+    malayalam_ratio: float  # share of Malayalam among Malayalam and Latin characters
+
+LANGUAGE_SAMPLE_CHARS = 4096
+
+# Unlike the old first-match scan this counts the whole sample to get a ratio, so on
+# Malayalam text it is slower than stopping at the first Malayalam character (about 2x
+# at 100 characters, 15x at 8,000 - still tens of microseconds); plain ASCII is faster
+def detect_language(message: str, requested: str = "english") -> LanguageDecision:
+    prefers_malayalam = requested.lower() == "malayalam"
+    if message.isascii():
+        # O(1) flag check in CPython; plain ASCII can't hold Malayalam script
+        has_letters = LATIN_LETTER_PATTERN.search(message) is not None
+        if prefers_malayalam:
+            return LanguageDecision("malayalam", 0.5, 0.0)
+        return LanguageDecision("english", 1.0 if has_letters else 0.5, 0.0)
+
+    # The script ratio is estimated on a bounded prefix; bytes.count and bytes.translate
+    # are single C loops over it
+    encoded = message[:LANGUAGE_SAMPLE_CHARS].encode("utf-8", "surrogatepass")
+    malayalam = encoded.count(MALAYALAM_UTF8_PREFIXES[0]) + encoded.count(MALAYALAM_UTF8_PREFIXES[1])
+    latin = len(encoded.translate(None, NON_LATIN_BYTES))
+    if not malayalam and len(message) > LANGUAGE_SAMPLE_CHARS:
+        # Past the sample only presence matters for routing; search from an offset
+        # instead of slicing and re-encoding the tail
+        malayalam = int(MALAYALAM_CHAR_PATTERN.search(message, LANGUAGE_SAMPLE_CHARS) is not None)
+    script_total = malayalam + latin
+    ratio = malayalam / script_total if script_total else 0.0
+
+    # Any Malayalam script, or an explicit Malayalam preference, routes to Malayalam;
+    # confidence says how much of the text backs that choice
+    if malayalam:
+        confidence = max(ratio, 0.5) if prefers_malayalam else ratio
+        return LanguageDecision("malayalam", round(confidence, 4), round(ratio, 4))
+    if prefers_malayalam:
+        return LanguageDecision("malayalam", 0.5, 0.0)
+    return LanguageDecision("english", 1.0 if latin else 0.5, 0.0)
+
+# Response Cache
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '86400'))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get('RESPONSE_CACHE_SIMILARITY', '0.92'))
+RESPONSE_CACHE_MONGO = os.environ.get('RESPONSE_CACHE_MONGO', 'true').lower() == 'true'
+
+def normalize_question(message: str) -> str:
+    # Lowercase, drop punctuation and zero-width joiners (common in Malayalam input)
+    text = unicodedata.normalize("NFC", message).replace("\u200c", "").replace("\u200d", "").lower()
+    text = re.sub(r"[^\w\u0D00-\u0D7F]+", " ", text)
+    return " ".join(text.split())
+
+NUMBER_PATTERN = re.compile(r"\d+")
+RESPONSE_CACHE_FUZZY_CANDIDATES = int(os.environ.get('RESPONSE_CACHE_FUZZY_CANDIDATES', '8'))
+
+def question_trigrams(question: str) -> set:
+    padded = f" {question} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl_seconds: int, similarity: float,
+                 use_mongo: bool = True, collection_name: str = "response_cache"):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.use_mongo = use_mongo
+        self.collection_name = collection_name
+        # (language, normalized question) -> (response, expires_at), oldest first
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # (language, trigram) -> keys containing it, for picking fuzzy candidates
+        self._postings: dict = {}
+        self._pending_writes = set()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _mongo_id(language: str, question: str) -> str:
+        return hashlib.sha1(f"{language}:{question}".encode("utf-8")).hexdigest()
+
+    def _lookup_memory(self, language: str, question: str) -> Optional[str]:
+        now = time.monotonic()
+        entry = self._entries.get((language, question))
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end((language, question))
+                return entry[0]
+            self._remove((language, question))
+
+        # Only the few entries sharing the most trigrams get the exact difflib ratio,
+        # so a miss costs the same however full the cache is
+        grams = question_trigrams(question)
+        postings = [self._postings.get((language, gram), ()) for gram in grams]
+        # Trigrams most entries share ("how", "what") don't tell candidates apart
+        common = max(32, len(self._entries) // 8)
+        postings = [keys for keys in postings if len(keys) <= common] or postings
+        shared: dict = {}
+        for keys in postings:
+            for key in keys:
+                shared[key] = shared.get(key, 0) + 1
+        best_key, best_score = None, self.similarity
+        candidates = heapq.nlargest(
+            RESPONSE_CACHE_FUZZY_CANDIDATES, shared,
+            key=lambda key: shared[key] / (len(grams) + len(key[1]))
+        )
+        for key in candidates:
+            if self._entries[key][1] <= now:
+                continue
+            candidate = key[1]
+            longest = max(len(candidate), len(question))
+            if abs(len(candidate) - len(question)) > longest * (1 - self.similarity):
+                continue
+            matcher = difflib.SequenceMatcher(None, question, candidate, autojunk=False)
+            if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                continue
+            score = matcher.ratio()
+            # "variety 12" and "variety 13" are near-identical strings but different questions
+            if score >= best_score and NUMBER_PATTERN.findall(candidate) == NUMBER_PATTERN.findall(question):
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        self.fuzzy_hits += 1
+        return self._entries[best_key][0]
+
+    def _store_memory(self, language: str, question: str, response: str, ttl: float):
+        key = (language, question)
+        if key not in self._entries:
+            for gram in question_trigrams(question):
+                self._postings.setdefault((language, gram), set()).add(key)
+        self._entries[key] = (response, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        for gram in question_trigrams(key[1]):
+            keys = self._postings[(key[0], gram)]
+            keys.discard(key)
+            if not keys:
+                del self._postings[(key[0], gram)]
+
+    async def get(self, language: str, message: str) -> Optional[str]:
+        question = normalize_question(message)
+        if not question:
+            return None
+        response = self._lookup_memory(language, question)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        if self.use_mongo:
+            try:
+                doc = await db[self.collection_name].find_one({
+                    "_id": self._mongo_id(language, question),
+                    "expires_at": {"$gt": datetime.now(timezone.utc)}
+                })
+            except Exception as e:
+                logging.error(f"Error reading response cache: {e}")
+                doc = None
+            if doc:
+                expires_at = doc["expires_at"]
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+                self._store_memory(language, question, doc["response"], remaining)
+                self.hits += 1
+                self.mongo_hits += 1
+                return doc["response"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, language: str, message: str, response: str):
+        question = normalize_question(message)
+        if not question:
+            return
+        self._store_memory(language, question, response, self.ttl_seconds)
+        if self.use_mongo:
+            # Persisting is off the response path; keep a reference so the task isn't collected
+            task = asyncio.create_task(self._store_mongo(language, question, response))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+
+    async def _store_mongo(self, language: str, question: str, response: str):
+        try:
+            await db[self.collection_name].replace_one(
+                {"_id": self._mongo_id(language, question)},
+                {
+                    "language": language,
+                    "question": question,
+                    "response": response,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logging.error(f"Error writing response cache: {e}")
+
+    async def warm(self, limit: int):
+        # Preload the freshest shared entries so a new worker starts with a hot cache
+        if not self.use_mongo or limit <= 0:
+            return
+        now = datetime.now(timezone.utc)
+        async for doc in db[self.collection_name].find({"expires_at": {"$gt": now}}).sort("expires_at", -1).limit(min(limit, self.max_entries)):
+            expires_at = doc["expires_at"]
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            self._store_memory(doc["language"], doc["question"], doc["response"], (expires_at - now).total_seconds())
+
+    async def ensure_indexes(self):
+        if self.use_mongo:
+            # Mongo's TTL monitor removes expired entries shared by all workers
+            await db[self.collection_name].create_index("expires_at", expireAfterSeconds=0)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_SIMILARITY,
+    use_mongo=RESPONSE_CACHE_MONGO
+) if RESPONSE_CACHE_ENABLED else None
+
+# Knowledge retrieval
+ENGLISH_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or should "
+    "the to what when where which who why will with you your".split()
+)
+# Question words carry no topic; as bigrams they only add noise ("എന്താണ്" ~ "കാണ്ഡ")
+MALAYALAM_STOPWORDS = frozenset(
+    "എന്ത് എന്താണ് എന്തെല്ലാം എന്തൊക്കെ എങ്ങനെ ഏത് ഏതാണ് ഏതെല്ലാം എത്ര എപ്പോൾ എവിടെ "
+    "ആര് എന്തുകൊണ്ട് ഉണ്ടോ എന്റെ".split()
+)
+
+# Bigram terms carry a prefix normalize_question can't produce, so a two-letter word
+# and a bigram never share a posting list
+KNOWLEDGE_BIGRAM_PREFIX = "~"
+# Bigrams in more than this share of chunks (suffixes like കൾ, ക്) are not indexed:
+# their IDF is near zero and their postings cover almost the whole index
+KNOWLEDGE_BIGRAM_MAX_DF = float(os.environ.get('KNOWLEDGE_BIGRAM_MAX_DF', '0.25'))
+# An unseen Malayalam word is looked up by its few rarest bigrams only, which keeps
+# the postings walked per word small and skips the least telling ones
+KNOWLEDGE_BIGRAMS_PER_WORD = int(os.environ.get('KNOWLEDGE_BIGRAMS_PER_WORD', '2'))
+
+def word_bigrams_terms(word: str) -> List[str]:
+    # Malayalam is agglutinative; character bigrams let stems match across suffixes
+    return [KNOWLEDGE_BIGRAM_PREFIX + word[i:i + 2] for i in range(len(word) - 1)]
+
+def knowledge_terms(text: str) -> List[str]:
+    terms = []
+    for word in normalize_question(text).split():
+        if word in MALAYALAM_STOPWORDS:
+            continue
+        if MALAYALAM_CHAR_PATTERN.search(word):
+            terms.append(word)
+            terms.extend(word_bigrams_terms(word))
+        elif word not in ENGLISH_STOPWORDS:
+            terms.append(word)
+    return terms
+
+def load_knowledge_chunks() -> List[dict]:
+    chunks = []
+    for block in KNOWLEDGE_SECTIONS.strip().split("\n\n"):
+        header, *lines = block.strip().splitlines()
+        section = header.rstrip(":")
+        for line in lines:
+            chunks.append({"section": section, "text": line.lstrip("- ").strip()})
+
+    # Extra entries (crops, districts, schemes) can ship as a JSON list of {section, text}
+    knowledge_path = os.environ.get('KNOWLEDGE_PATH')
+    if knowledge_path:
+        with open(ROOT_DIR / knowledge_path, encoding="utf-8") as f:
+            chunks.extend({"section": item.get("section", ""), "text": item["text"]} for item in json.load(f))
+    return chunks
+
+class KnowledgeIndex:
+    # Okapi BM25 over an inverted index; a lookup only touches postings of the query terms
+    def __init__(self, chunks: List[dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._postings: dict = {}
+        doc_lengths = []
+        for doc_id, chunk in enumerate(chunks):
+            terms = knowledge_terms(f"{chunk['section']} {chunk['text']}")
+            doc_lengths.append(len(terms))
+            counts: dict = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((doc_id, tf))
+
+        total = len(chunks)
+        max_bigram_df = max(1, int(total * KNOWLEDGE_BIGRAM_MAX_DF))
+        for term in [term for term, postings in self._postings.items()
+                     if term.startswith(KNOWLEDGE_BIGRAM_PREFIX) and len(postings) > max_bigram_df]:
+            del self._postings[term]
+        average_length = (sum(doc_lengths) / total) if total else 0.0
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        # The BM25 term-frequency part depends only on the document, so fold it into
+        # the postings once here; a lookup is then one multiply-add per posting
+        norms = [
+            self.k1 * (1 - self.b + self.b * length / average_length) if average_length else self.k1
+            for length in doc_lengths
+        ]
+        for postings in self._postings.values():
+            postings[:] = [(doc_id, tf * (self.k1 + 1) / (tf + norms[doc_id])) for doc_id, tf in postings]
+
+    def query_terms(self, query: str) -> set:
+        terms = set()
+        for word in normalize_question(query).split():
+            if word in MALAYALAM_STOPWORDS:
+                continue
+            if MALAYALAM_CHAR_PATTERN.search(word):
+                # A word found as-is needs no stem matching; bigrams are the fallback
+                # for inflected forms the index hasn't seen
+                if word in self._postings:
+                    terms.add(word)
+                else:
+                    bigrams = [term for term in word_bigrams_terms(word) if term in self._postings]
+                    bigrams.sort(key=lambda term: len(self._postings[term]))
+                    terms.update(bigrams[:KNOWLEDGE_BIGRAMS_PER_WORD])
+            elif word not in ENGLISH_STOPWORDS:
+                terms.add(word)
+        return terms
+
+    def search(self, query: str, k: int) -> List[dict]:
+        scores: dict = {}
+        for term in self.query_terms(query):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc_id, weight in postings:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [self.chunks[doc_id] for doc_id, _ in best]
+
+knowledge_index = KnowledgeIndex(load_knowledge_chunks()) if KNOWLEDGE_RETRIEVAL_ENABLED else None
+
+def with_reference_notes(message: str) -> str:
+    if not knowledge_index:
+        return message
+    notes = knowledge_index.search(message, KNOWLEDGE_TOP_K)
+    if not notes:
+        return message
+    reference = "\n".join(f"- {chunk['section']}: {chunk['text']}" for chunk in notes)
+    return f"Reference notes:\n{reference}\n\nQuestion: {message}"
+
+# Conversation context
+CONTEXT_ENABLED = os.environ.get('CONTEXT_ENABLED', 'true').lower() == 'true'
+CONTEXT_RECENT_TURNS = int(os.environ.get('CONTEXT_RECENT_TURNS', '6'))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '1200'))
+CONTEXT_TURN_MAX_CHARS = int(os.environ.get('CONTEXT_TURN_MAX_CHARS', '800'))
+CONTEXT_SUMMARY_BATCH = int(os.environ.get('CONTEXT_SUMMARY_BATCH', '4'))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.environ.get('CONTEXT_SUMMARY_MAX_TOKENS', '300'))
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a farmer and Kisan Vani, an agricultural assistant.
+Merge the new turns into the existing summary. Keep the crops, locations, pests, schemes, quantities and open questions the farmer mentioned.
+Write plain sentences in the language the farmer uses. Reply with the updated summary only."""
+
+def estimate_tokens(text: str) -> int:
+    # Conservative and cheap: ~3 UTF-8 bytes per token overestimates English a little
+    # and roughly matches Malayalam, where each character is 3 bytes
+    return len(text.encode("utf-8")) // 3 + 1
+
+def clip_to_tokens(text: str, tokens: int) -> str:
+    encoded = text.encode("utf-8")
+    if len(encoded) <= tokens * 3:
+        return text
+    return encoded[:tokens * 3].decode("utf-8", "ignore") + "…"
+
+def history_position(msg: dict) -> tuple:
+    timestamp = msg["timestamp"]
+    if isinstance(timestamp, datetime) and timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp, msg["id"]
+
+# Words that point back at an earlier turn. Deliberately broad: a false positive only
+# costs a cache lookup, while a missed follow-up gets answered without its context
+FOLLOW_UP_WORDS = frozenset([
+    "it", "its", "that", "this", "these", "those", "they", "them", "same", "again",
+    "instead", "above", "previous", "earlier", "else", "another",
+    "അത്", "ഇത്", "അതിന്", "ഇതിന്", "അതിനെ", "ഇതിനെ", "അതിന്റെ", "ഇതിന്റെ",
+    "അവ", "അവയ്ക്ക്", "അതേ", "ഇതേ", "പിന്നെ", "വീണ്ടും", "മറ്റൊരു"
+])
+FOLLOW_UP_OPENERS = ("and", "but", "so", "then", "what about", "how about")
+
+def is_follow_up(message: str) -> bool:
+    # Standalone questions are answered without conversation context, which lets
+    # them share the response cache; only follow-ups pay for the session's history
+    words = normalize_question(message).split()
+    if len(words) <= 2:
+        return True
+    text = " ".join(words)
+    if any(text == opener or text.startswith(opener + " ") for opener in FOLLOW_UP_OPENERS):
+        return True
+    return any(word in FOLLOW_UP_WORDS for word in words)
+
+class ConversationContextBuilder:
+    # The prompt carries a rolling summary plus the last few turns, capped at a token
+    # budget, so its size stays flat however long the session runs. Turns that age
+    # out of the window are folded into the summary in the background, a batch at a time.
+    def __init__(self, recent_turns: int, token_budget: int, summary_batch: int,
+                 collection_name: str = "conversation_summaries"):
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_batch = summary_batch
+        self.collection_name = collection_name
+        self._summarizing: set = set()
+        self._tasks: set = set()
+        self.summaries_updated = 0
+        self.summary_failures = 0
+
+    async def build(self, session_id: str) -> Optional[str]:
+        try:
+            if chat_writer.has_pending(session_id):
+                await chat_writer.flush()
+            (recent, has_older), summary_doc = await asyncio.gather(
+                fetch_chat_history(session_id, self.recent_turns),
+                db[self.collection_name].find_one({"_id": session_id})
+            )
+        except Exception as e:
+            logging.error(f"Error loading conversation context: {e}")
+            return None
+        if not recent:
+            return None
+        if has_older:
+            self._schedule_summary(session_id, summary_doc, history_position(recent[0]))
+
+        remaining = self.token_budget
+        sections = []
+        summary = (summary_doc or {}).get("summary")
+        if summary:
+            summary_text = "Summary of earlier conversation: " + clip_to_tokens(summary, min(CONTEXT_SUMMARY_MAX_TOKENS, remaining // 3))
+            remaining -= estimate_tokens(summary_text)
+            sections.append(summary_text)
+
+        turns = []
+        for msg in reversed(recent):
+            turn = f"Farmer: {msg['message'][:CONTEXT_TURN_MAX_CHARS]}\nKisan Vani: {msg['response'][:CONTEXT_TURN_MAX_CHARS]}"
+            cost = estimate_tokens(turn)
+            if cost > remaining:
+                break
+            turns.append(turn)
+            remaining -= cost
+        sections.extend(reversed(turns))
+        return "Conversation so far:\n" + "\n".join(sections) if sections else None
+
+    def _schedule_summary(self, session_id: str, summary_doc: Optional[dict], window_start: tuple):
+        if session_id in self._summarizing:
+            return
+        self._summarizing.add(session_id)
+        task = asyncio.create_task(self._update_summary(session_id, summary_doc, window_start))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update_summary(self, session_id: str, summary_doc: Optional[dict], window_start: tuple):
+        try:
+            summary_doc = summary_doc or {}
+            # Without a summary yet, page forward from the very first turn
+            start = summary_doc.get("summarized_until") or encode_history_cursor({"timestamp": datetime(1970, 1, 1), "id": ""})
+            turns, _ = await fetch_chat_history(session_id, self.summary_batch, after=start)
+            turns = [msg for msg in turns if history_position(msg) < window_start]
+            if len(turns) < self.summary_batch:
+                return
+
+            summary = summary_doc.get("summary", "")
+            transcript = "\n".join(
+                f"Farmer: {msg['message'][:CONTEXT_TURN_MAX_CHARS]}\nKisan Vani: {msg['response'][:CONTEXT_TURN_MAX_CHARS]}"
+                for msg in turns
+            )
+            try:
+                chat = new_chat_client(f"{session_id}-summary-{uuid.uuid4().hex[:8]}", SUMMARY_SYSTEM_PROMPT)
+                prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+                summary = await llm_scheduler.run(
+                    ("summary", session_id, history_position(turns[-1])),
+                    session_id,
+                    # Same timeout, retry budget and breaker as answers, so a degraded
+                    # provider can't hold a scheduler slot with a summary call
+                    lambda: send_with_retries(lambda: chat.send_message(UserMessage(text=prompt)))
+                )
+            except Exception as e:
+                # Keep the window moving with an extractive summary rather than stalling
+                logging.error(f"Error summarizing conversation: {e}")
+                self.summary_failures += 1
+                summary = " ".join(filter(None, [summary] + [f"Farmer asked: {msg['message'][:160]}" for msg in turns]))
+
+            await db[self.collection_name].replace_one(
+                {"_id": session_id},
+                {
+                    "summary": clip_to_tokens(summary, CONTEXT_SUMMARY_MAX_TOKENS * 2),
+                    "summarized_until": encode_history_cursor(turns[-1]),
+                    "turns_summarized": summary_doc.get("turns_summarized", 0) + len(turns),
+                    "updated_at": datetime.now(timezone.utc)
+                },
+                upsert=True
+            )
+            self.summaries_updated += 1
+        except Exception as e:
+            logging.error(f"Error updating conversation summary: {e}")
+        finally:
+            self._summarizing.discard(session_id)
+
+    def stats(self) -> dict:
+        return {
+            "summaries_updated": self.summaries_updated,
+            "summary_failures": self.summary_failures,
+            "summarizing": len(self._summarizing)
+        }
+
+conversation_context = ConversationContextBuilder(
+    CONTEXT_RECENT_TURNS,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_SUMMARY_BATCH
+) if CONTEXT_ENABLED else None
+
+# LLM clients
+# LlmChat keeps the transcript of everything sent through it, so a client is never
+# reused across calls: each call is stateless like the original per-request client,
+# the conversation comes only from the context builder, and a coalesced answer can't
+# carry one session's history into another's. Construction only stores its arguments;
+# the system prompts it needs are precomputed in SYSTEM_PROMPTS.
+def new_chat_client(session_id: str, system_message: str) -> LlmChat:
+    return LlmChat(
+        api_key=os.environ.get('EMERGENT_LLM_KEY'),
+        session_id=session_id,
+        system_message=system_message
+    ).with_model("openai", "gpt-4o-mini")
+
+# LLM request scheduler
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '16'))
+LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', '200'))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('LLM_QUEUE_TIMEOUT_SECONDS', '10'))
+LLM_MAX_PENDING_PER_SESSION = int(os.environ.get('LLM_MAX_PENDING_PER_SESSION', '4'))
+
+class LLMOverloaded(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, max_pending_per_session: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_pending_per_session = max_pending_per_session
+        self.active = 0
+        self.queued = 0
+        # session_id -> waiters; sessions are served round-robin so one client can't starve others
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+        # coalescing key -> task running the upstream call, and how many callers await it
+        self._inflight: dict = {}
+        self._callers: dict = {}
+        self._pending: dict = {}
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def run(self, key, session_id: str, call: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
         else:
-            system_message += "\n\nThe user is asking in English. Respond in English with some Malayalam terms in brackets to help with local understanding."
+            if self._pending.get(session_id, 0) >= self.max_pending_per_session:
+                self.rejected += 1
+                raise LLMOverloaded(429, "Too many pending requests for this session", 1)
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+            # The call runs detached from the caller that started it, so one client
+            # disconnecting doesn't cancel the answer other coalesced callers wait for
+            task = asyncio.create_task(self._execute(key, session_id, call))
+            self._inflight[key] = task
+
+        self._callers[task] = self._callers.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._callers[task] -= 1
+            if not self._callers[task]:
+                del self._callers[task]
+                # Only stop the upstream call once nobody is left to use its answer
+                if not task.done():
+                    task.cancel()
+
+    async def _execute(self, key, session_id: str, call: Callable[[], Awaitable]):
+        try:
+            await self._acquire(session_id)
+            try:
+                result = await call()
+            finally:
+                self._release()
+            self.completed += 1
+            return result
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+            self._pending[session_id] -= 1
+            if not self._pending[session_id]:
+                del self._pending[session_id]
+
+    async def _acquire(self, session_id: str):
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise LLMOverloaded(503, "Service is busy, please retry shortly", math.ceil(self.queue_timeout))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                self._discard(session_id, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise LLMOverloaded(503, "Service is busy, please retry shortly", math.ceil(self.queue_timeout))
+            raise
+
+    def _discard(self, session_id: str, waiter: asyncio.Future):
+        queue = self._waiting.get(session_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.queued -= 1
+        if not queue:
+            del self._waiting[session_id]
+
+    def _release(self):
+        # Hand the slot straight to the next session in rotation instead of freeing it
+        while self._waiting:
+            session_id, queue = next(iter(self._waiting.items()))
+            waiter = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._waiting.move_to_end(session_id)
+            else:
+                del self._waiting[session_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+llm_scheduler = LLMScheduler(
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_MAX_PENDING_PER_SESSION
+)
+
+# Upstream fail-fast: per-attempt timeout inside an overall deadline, jittered retries
+# limited by a retry budget, and a circuit breaker that stops calling a failing provider
+LLM_CALL_TIMEOUT_SECONDS = float(os.environ.get('LLM_CALL_TIMEOUT_SECONDS', '15'))
+LLM_DEADLINE_SECONDS = float(os.environ.get('LLM_DEADLINE_SECONDS', '25'))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '1'))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.environ.get('LLM_RETRY_BASE_DELAY_SECONDS', '0.25'))
+LLM_RETRY_BUDGET_RATIO = float(os.environ.get('LLM_RETRY_BUDGET_RATIO', '0.1'))
+LLM_RETRY_BUDGET_MAX = float(os.environ.get('LLM_RETRY_BUDGET_MAX', '10'))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+FAQ_FALLBACK_MATCH_THRESHOLD = float(os.environ.get('FAQ_FALLBACK_MATCH_THRESHOLD', '0.5'))
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+    # closed: calls go through. open: calls fail immediately until reset_seconds pass.
+    # half_open: a single probe call decides whether to close or open again.
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._set_state("half_open")
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self._probing = False
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logging.info("LLM circuit breaker closed")
+            self._set_state("closed")
+
+    def record_failure(self):
+        self._probing = False
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+            logging.error(f"LLM circuit breaker opened after {self.consecutive_failures} consecutive failures")
+            self._opened_at = time.monotonic()
+            self.opened += 1
+            self._set_state("open")
+
+    def release(self):
+        # A cancelled probe proves nothing either way; let the next call probe
+        self._probing = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        LLM_BREAKER_OPEN.value = 0 if state == "closed" else 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected
+        }
+
+class RetryBudget:
+    # Token bucket: every first attempt earns `ratio` tokens and every retry spends one,
+    # so retries stay a small share of traffic and can't multiply load during an outage
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        self.retries += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "tokens": round(self.tokens, 2),
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+llm_breaker = CircuitBreaker(LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+llm_retry_budget = RetryBudget(LLM_RETRY_BUDGET_RATIO, LLM_RETRY_BUDGET_MAX)
+
+async def send_with_retries(send: Callable[[], Awaitable]):
+    deadline = time.monotonic() + LLM_DEADLINE_SECONDS
+    llm_retry_budget.deposit()
+    attempt = 0
+    while True:
+        if not llm_breaker.allow():
+            raise CircuitOpen("LLM circuit breaker is open")
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(send(), min(LLM_CALL_TIMEOUT_SECONDS, deadline - time.monotonic()))
+        except asyncio.CancelledError:
+            llm_breaker.release()
+            raise
+        except Exception as e:
+            UPSTREAM_ERRORS.inc()
+            llm_breaker.record_failure()
+            # Full jitter keeps retries from a burst of failures from arriving together
+            delay = random.uniform(0, LLM_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+            if (attempt >= LLM_MAX_RETRIES or time.monotonic() + delay >= deadline
+                    or llm_breaker.state == "open" or not llm_retry_budget.withdraw()):
+                raise
+            logging.error(f"LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            observe_stage("llm", LLM_CALL_SECONDS, time.perf_counter() - started)
+        llm_breaker.record_success()
+        return result
+
+FALLBACK_RESPONSES = {
+    "malayalam": "ക്ഷമിക്കണം, ഇപ്പോൾ നിങ്ങളുടെ ചോദ്യം പ്രോസസ്സ് ചെയ്യാൻ പ്രശ്നമുണ്ട്. ദയവായി വീണ്ടും ശ്രമിക്കുക.",
+    "english": "I'm sorry, I'm having trouble processing your request right now. Please try again."
+}
+
+# Served without waiting while the circuit breaker is open
+UNAVAILABLE_RESPONSES = {
+    "malayalam": "ക്ഷമിക്കണം, കിസാൻ വാണി ഇപ്പോൾ താൽക്കാലികമായി ലഭ്യമല്ല. കുറച്ച് മിനിറ്റുകൾക്ക് ശേഷം വീണ്ടും ശ്രമിക്കുക, അല്ലെങ്കിൽ പതിവ് ചോദ്യങ്ങൾ നോക്കുക.",
+    "english": "I'm sorry, Kisan Vani is temporarily unavailable. Please try again in a few minutes, or check the frequently asked questions."
+}
+
+class Answer(NamedTuple):
+    text: str
+    source: str  # "faq", "cache", "llm" or "fallback"
+
+# Initialize LLM Chat
+async def generate_answer(message: str, session_id: str, language: str = "english",
+                          decision: Optional[LanguageDecision] = None) -> Answer:
+    # Malayalam if the message contains Malayalam script OR the language is set to Malayalam
+    response_language = (decision or detect_language(message, language)).language
+    try:
+        context = None
+        if conversation_context and is_follow_up(message):
+            context = await conversation_context.build(session_id)
+
+        # Answers that lean on earlier turns are specific to this session, so they
+        # neither come from nor go into the shared cache
+        if response_cache and not context:
+            cached = await response_cache.get(response_language, message)
+            if cached is not None:
+                return Answer(cached, "cache")
         
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=session_id,
-            system_message=system_message
-        ).with_model("openai", "gpt-4o-mini")
+        chat = new_chat_client(session_id, SYSTEM_PROMPTS[response_language])
         
-        user_message = UserMessage(text=message)
-        response = await chat.send_message(user_message)
-        return response
+        prompt = with_reference_notes(message)
+        user_message = UserMessage(text=f"{context}\n\n{prompt}" if context else prompt)
+        # Identical concurrent questions share one upstream call
+        coalesce_key = (response_language, normalize_question(message))
+        response = await llm_scheduler.run(
+            (session_id,) + coalesce_key if context else coalesce_key,
+            session_id,
+            lambda: send_with_retries(lambda: chat.send_message(user_message))
+        )
+        if response_cache and not context:
+            await response_cache.set(response_language, message, response)
+        return Answer(response, "llm")
+    except LLMOverloaded:
+        raise
+    except CircuitOpen:
+        return await degraded_answer(message, response_language, UNAVAILABLE_RESPONSES)
     except Exception as e:
-        logging.error(f"Error getting AI response: {e}")
-        if language.lower() == "malayalam":
-            return "ക്ഷമിക്കണം, ഇപ്പോൾ നിങ്ങളുടെ ചോദ്യം പ്രോസസ്സ് ചെയ്യാൻ പ്രശ്നമുണ്ട്. ദയവായി വീണ്ടും ശ്രമിക്കുക."
-        else:
-            return "I'm sorry, I'm having trouble processing your request right now. Please try again."
+        logging.error(f"Error getting AI response: {type(e).__name__}: {e}")
+        return await degraded_answer(message, response_language, FALLBACK_RESPONSES)
+
+async def degraded_answer(message: str, language: str, apologies: dict) -> Answer:
+    # Without the LLM, a cached answer (even one skipped for having conversation
+    # context) or a looser FAQ match beats an apology
+    cached = await response_cache.get(language, message) if response_cache else None
+    if cached is not None:
+        return Answer(cached, "cache")
+    # Best effort: a related FAQ answer, even for a more specific question
+    faq_answer = faq_store.match(message, language, threshold=FAQ_FALLBACK_MATCH_THRESHOLD, max_new_words=None)
+    if faq_answer is not None:
+        return Answer(faq_answer, "faq")
+    FALLBACK_RESPONSES_SERVED.inc()
+    return Answer(apologies[language], "fallback")
+
+async def get_ai_response(message: str, session_id: str, language: str = "english") -> str:
+    return (await generate_answer(message, session_id, language)).text
+
+async def answer_question(message: str, session_id: str, language: str = "english") -> Answer:
+    decision = detect_language(message, language)
+    # Curated FAQ answers short-circuit the cache and the LLM entirely
+    faq_answer = faq_store.match(message, decision.language)
+    if faq_answer is not None:
+        answer = Answer(faq_answer, "faq")
+    else:
+        answer = await generate_answer(message, session_id, language, decision)
+    ANSWERS.inc(answer.source)
+    return answer
+
+def answer_tokens(text: str) -> List[str]:
+    # LlmChat only exposes a whole-message send_message, so answers are re-chunked
+    # word by word. Streaming callers flush their opening event before answering,
+    # which is what moves time-to-first-byte ahead of the upstream call.
+    return re.findall(r"\S+\s*|\s+", text)
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+# Chat message write-behind buffer
+CHAT_WRITE_BATCH_SIZE = int(os.environ.get('CHAT_WRITE_BATCH_SIZE', '100'))
+CHAT_WRITE_FLUSH_INTERVAL_SECONDS = float(os.environ.get('CHAT_WRITE_FLUSH_INTERVAL_SECONDS', '0.5'))
+CHAT_WRITE_MAX_PENDING = int(os.environ.get('CHAT_WRITE_MAX_PENDING', '5000'))
+CHAT_WRITE_MAX_RETRIES = int(os.environ.get('CHAT_WRITE_MAX_RETRIES', '5'))
+
+class ChatMessageWriter:
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int, max_retries: int,
+                 collection_name: str = "chat_messages"):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.collection_name = collection_name
+        # FIFO across all sessions, so per-session insert order matches arrival order
+        self._pending: List[dict] = []
+        self._pending_sessions: dict = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._failures = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def add(self, doc: dict):
+        self._ensure_worker()
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+            if len(self._pending) >= self.max_pending:
+                # Mongo is not keeping up; bound memory by shedding the oldest message
+                self._drop(self._pending[:1])
+                self.dropped += 1
+                logging.error("Chat message buffer full, dropped oldest message")
+        self._pending.append(doc)
+        self._pending_sessions[doc["session_id"]] = self._pending_sessions.get(doc["session_id"], 0) + 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def has_pending(self, session_id: str) -> bool:
+        return session_id in self._pending_sessions
+
+    def _drop(self, docs: List[dict]):
+        del self._pending[:len(docs)]
+        for doc in docs:
+            remaining = self._pending_sessions[doc["session_id"]] - 1
+            if remaining:
+                self._pending_sessions[doc["session_id"]] = remaining
+            else:
+                del self._pending_sessions[doc["session_id"]]
+
+    async def flush(self) -> bool:
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                started = time.perf_counter()
+                try:
+                    await db[self.collection_name].insert_many(batch, ordered=True)
+                except Exception as e:
+                    # Ordered inserts stop at the first error; keep only what wasn't written
+                    inserted = e.details.get("nInserted", 0) if isinstance(e, BulkWriteError) else 0
+                    self.written += inserted
+                    self._drop(batch[:inserted])
+                    self.failed_flushes += 1
+                    self._failures += 1
+                    logging.error(f"Error flushing chat messages: {e}")
+                    if self._failures > self.max_retries:
+                        self.dropped += len(batch) - inserted
+                        self._drop(batch[inserted:])
+                        self._failures = 0
+                        logging.error(f"Dropped {len(batch) - inserted} chat messages after {self.max_retries} retries")
+                    return False
+                finally:
+                    MONGO_INSERT_SECONDS.observe(time.perf_counter() - started)
+                self.written += len(batch)
+                self._drop(batch)
+                self._failures = 0
+            return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not await self.flush():
+                await asyncio.sleep(min(self.flush_interval * 2 ** self._failures, 30))
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for _ in range(self.max_retries + 1):
+            if await self.flush():
+                break
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes
+        }
+
+chat_writer = ChatMessageWriter(
+    CHAT_WRITE_BATCH_SIZE,
+    CHAT_WRITE_FLUSH_INTERVAL_SECONDS,
+    CHAT_WRITE_MAX_PENDING,
+    CHAT_WRITE_MAX_RETRIES
+)
 
 # Define Models
 class ChatMessage(BaseModel):
@@ -116,6 +1289,9 @@ class ChatMessage(BaseModel):
     message: str
     response: str
     language: str = "english"
+    source: str = "llm"
+    # Stored so analytics can group repeat questions without re-normalizing in Mongo
+    question_key: str = Field(default_factory=lambda data: normalize_question(data["message"]))
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ChatRequest(BaseModel):
@@ -127,6 +1303,30 @@ class ChatResponse(BaseModel):
     id: str
     response: str
     timestamp: datetime
+    source: str = "llm"
+
+# Batch chat, for field agents syncing questions collected offline
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get('CHAT_BATCH_MAX_ITEMS', '100'))
+# Defaults to the scheduler's per-session cap so a single-session batch never gets a 429
+CHAT_BATCH_CONCURRENCY = int(os.environ.get('CHAT_BATCH_CONCURRENCY', str(LLM_MAX_PENDING_PER_SESSION)))
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1, max_length=CHAT_BATCH_MAX_ITEMS)
+
+class ChatBatchItem(BaseModel):
+    index: int
+    status: int
+    id: Optional[str] = None
+    response: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    source: Optional[str] = None
+    detail: Optional[str] = None
+    retry_after: Optional[int] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
+    saved: int
+    queued: int
 
 # FAQ Data
 FAQ_DATA = {
@@ -176,6 +1376,236 @@ FAQ_DATA = {
     ]
 }
 
+# FAQ payloads are serialized and compressed once per (re)load, not per request
+FAQ_SOURCE = os.environ.get('FAQ_SOURCE', 'builtin')  # builtin, file or mongo
+FAQ_PATH = os.environ.get('FAQ_PATH', 'faq.json')
+FAQ_RELOAD_INTERVAL_SECONDS = float(os.environ.get('FAQ_RELOAD_INTERVAL_SECONDS', '30'))
+FAQ_CACHE_MAX_AGE = int(os.environ.get('FAQ_CACHE_MAX_AGE', '300'))
+
+class FAQPayload(NamedTuple):
+    body: bytes
+    gzip_body: bytes
+    brotli_body: Optional[bytes]
+    etag: str
+
+def build_faq_payload(items: List[dict]) -> FAQPayload:
+    body = json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return FAQPayload(
+        body=body,
+        # mtime=0 keeps the bytes identical across workers and restarts
+        gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+        brotli_body=brotli.compress(body) if brotli else None,
+        etag=hashlib.sha256(body).hexdigest()[:32]
+    )
+
+FAQ_MATCH_ENABLED = os.environ.get('FAQ_MATCH_ENABLED', 'true').lower() == 'true'
+FAQ_MATCH_THRESHOLD = float(os.environ.get('FAQ_MATCH_THRESHOLD', '0.75'))
+# Content words in the question that the FAQ question doesn't have ("rice" in "pest
+# attacks on rice?") make it a different question however close the wording is
+FAQ_MATCH_MAX_NEW_WORDS = int(os.environ.get('FAQ_MATCH_MAX_NEW_WORDS', '0'))
+FAQ_STOPWORDS = frozenset(
+    "a an the to of for on in at by with from about and or my our your me we i you "
+    "do does did is are am be can could should would will how what which when where "
+    "why who any some all please".split()
+) | MALAYALAM_STOPWORDS
+
+def char_ngrams(text: str, n: int = 3) -> dict:
+    padded = f" {normalize_question(text)} "
+    counts: dict = {}
+    for i in range(len(padded) - n + 1):
+        gram = padded[i:i + n]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+def word_bigrams(word: str) -> set:
+    return {word[i:i + 2] for i in range(len(word) - 1)} or {word}
+
+def new_content_words(message: str, question_words: List[set]) -> int:
+    # A word is covered when it shares most of its character bigrams with a word of
+    # the FAQ question, which tolerates plurals and Malayalam case suffixes
+    count = 0
+    for word in normalize_question(message).split():
+        if word in FAQ_STOPWORDS:
+            continue
+        grams = word_bigrams(word)
+        if not any(2 * len(grams & other) / (len(grams) + len(other)) >= 0.5 for other in question_words):
+            count += 1
+    return count
+
+class FAQMatcher:
+    # TF-IDF cosine over character trigrams of the FAQ questions in every language.
+    # Trigrams tolerate typos, punctuation and Malayalam suffix changes.
+    def __init__(self, data: dict):
+        self.entries = [
+            (language, item["id"], item["answer"])
+            for language, items in data.items()
+            for item in items
+        ]
+        self.question_words = [
+            [word_bigrams(word) for word in normalize_question(item["question"]).split()]
+            for items in data.values()
+            for item in items
+        ]
+        # FAQ ids line up across languages, so a match can answer in the asker's language
+        self.answers = {(language, item["id"]): item["answer"] for language, items in data.items() for item in items}
+        questions = [char_ngrams(item["question"]) for items in data.values() for item in items]
+        document_frequency: dict = {}
+        for grams in questions:
+            for gram in grams:
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+        total = len(questions)
+        self._idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+        self._postings: dict = {}
+        for entry_id, grams in enumerate(questions):
+            weights = {gram: tf * self._idf[gram] for gram, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for gram, weight in weights.items():
+                self._postings.setdefault(gram, []).append((entry_id, weight / norm))
+        self.checks = 0
+        self.matches = 0
+        self.rejected = 0
+
+    def match(self, message: str, language: str, threshold: float,
+              max_new_words: Optional[int] = None) -> Optional[str]:
+        self.checks += 1
+        grams = char_ngrams(message)
+        # Unknown grams still count towards the query norm so extra words lower the score
+        weights = {gram: tf * self._idf.get(gram, math.log(1 + len(self.entries)) + 1) for gram, tf in grams.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return None
+        scores: dict = {}
+        for gram, weight in weights.items():
+            for entry_id, entry_weight in self._postings.get(gram, ()):
+                scores[entry_id] = scores.get(entry_id, 0.0) + weight * entry_weight
+        if not scores:
+            return None
+        entry_id, score = max(scores.items(), key=lambda item: item[1])
+        if score / norm < threshold:
+            return None
+        if max_new_words is not None and new_content_words(message, self.question_words[entry_id]) > max_new_words:
+            self.rejected += 1
+            return None
+        self.matches += 1
+        matched_language, faq_id, answer = self.entries[entry_id]
+        return self.answers.get((language.lower(), faq_id), answer)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "checks": self.checks,
+            "matches": self.matches,
+            "rejected": self.rejected,
+            "match_rate": round(self.matches / self.checks, 4) if self.checks else 0.0
+        }
+
+class FAQStore:
+    def __init__(self, source: str, path: Path, collection_name: str = "faq"):
+        self.source = source
+        self.path = path
+        self.collection_name = collection_name
+        self.data: dict = {}
+        self.payloads: dict = {}
+        self.matcher: Optional[FAQMatcher] = None
+        self._file_mtime: Optional[float] = None
+        self.reloads = 0
+
+    def load(self, data: dict):
+        # An empty source (e.g. a missing faq collection) must not replace good FAQs
+        if not data:
+            raise ValueError("FAQ source has no languages")
+        for language, items in data.items():
+            if not isinstance(items, list) or not items or not all({"id", "question", "answer"} <= set(item) for item in items):
+                raise ValueError(f"Invalid FAQ entries for {language}")
+        self.payloads = {language: build_faq_payload(items) for language, items in data.items()}
+        self.matcher = FAQMatcher(data)
+        self.data = data
+        self.reloads += 1
+
+    async def _read_source(self) -> Optional[dict]:
+        if self.source == "file":
+            mtime = self.path.stat().st_mtime
+            if mtime == self._file_mtime:
+                return None
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._file_mtime = mtime
+            return data
+        if self.source == "mongo":
+            data: dict = {}
+            async for doc in db[self.collection_name].find({}, {"_id": 0}).sort([("language", 1), ("order", 1)]):
+                language = doc.pop("language")
+                doc.pop("order", None)
+                data.setdefault(language, []).append(doc)
+            return data
+        return FAQ_DATA if not self.data else None
+
+    async def reload(self) -> bool:
+        try:
+            data = await self._read_source()
+            if data is None or data == self.data:
+                return False
+            self.load(data)
+            logging.info(f"Loaded FAQ from {self.source}: {', '.join(f'{k}={len(v)}' for k, v in data.items())}")
+            return True
+        except Exception as e:
+            # Keep serving the last good payloads
+            logging.error(f"Error loading FAQ from {self.source}: {e}")
+            return False
+
+    def match(self, message: str, language: str, threshold: float = FAQ_MATCH_THRESHOLD,
+              max_new_words: Optional[int] = FAQ_MATCH_MAX_NEW_WORDS) -> Optional[str]:
+        if not FAQ_MATCH_ENABLED or self.matcher is None:
+            return None
+        return self.matcher.match(message, language, threshold, max_new_words)
+
+    async def watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload()
+
+faq_store = FAQStore(FAQ_SOURCE, ROOT_DIR / FAQ_PATH)
+faq_store.load(FAQ_DATA)
+
+def choose_encoding(accept_encoding: str, available: List[str]) -> Optional[str]:
+    # Highest q-value wins, ties go to the first (smallest) available encoding; q=0 refuses
+    qualities: dict = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            qualities[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def etag_matches(if_none_match: str, etags: List[str]) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
+
+# Admin endpoints
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    # Admin endpoints (FAQ reload, export, analytics) stay disabled until ADMIN_TOKEN
+    # is configured; export and analytics cover every farmer's conversations
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -183,43 +1613,305 @@ async def root():
 
 @api_router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(request: ChatRequest):
+    async with lifecycle.track_chat():
+        return await process_chat(request)
+
+async def process_chat(request: ChatRequest) -> ChatResponse:
     try:
         # Get AI response
-        ai_response = await get_ai_response(request.message, request.session_id, request.language)
+        answer = await answer_question(request.message, request.session_id, request.language)
         
         # Create chat message object
         chat_message = ChatMessage(
             session_id=request.session_id,
             message=request.message,
-            response=ai_response,
-            language=request.language
+            response=answer.text,
+            language=request.language,
+            source=answer.source
         )
         
-        # Save to database
-        await db.chat_messages.insert_one(chat_message.dict())
+        # Queue for a batched insert instead of a round trip on the response path
+        await chat_writer.add(chat_message.dict())
         
         return ChatResponse(
             id=chat_message.id,
-            response=ai_response,
-            timestamp=chat_message.timestamp
+            response=answer.text,
+            timestamp=chat_message.timestamp,
+            source=answer.source
         )
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logging.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail="Failed to process chat message")
 
+@api_router.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest):
+    if lifecycle.draining:
+        raise HTTPException(status_code=503, detail="Server is shutting down", headers={"Retry-After": "1"})
+    chat_message = ChatMessage(
+        session_id=request.session_id,
+        message=request.message,
+        response="",
+        language=request.language
+    )
+    completed = False
+
+    async def event_stream():
+        nonlocal completed
+        yield format_sse("start", {"id": chat_message.id, "timestamp": chat_message.timestamp.isoformat()})
+        async with lifecycle.track_chat():
+            try:
+                answer = await answer_question(request.message, request.session_id, request.language)
+            except LLMOverloaded as e:
+                # Headers are already sent, so overload is reported in-band
+                yield format_sse("error", {"status": e.status_code, "detail": e.detail, "retry_after": e.retry_after})
+                return
+            for token in answer_tokens(answer.text):
+                yield format_sse("token", {"text": token})
+            chat_message.response = answer.text
+            chat_message.source = answer.source
+            completed = True
+            yield format_sse("done", {"id": chat_message.id, "response": answer.text, "source": answer.source})
+
+    async def save_message():
+        # Runs after the response body is closed; an aborted stream is not stored
+        if not completed:
+            return
+        await chat_writer.add(chat_message.dict())
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(save_message)
+    )
+
+def batch_key(request: ChatRequest) -> tuple:
+    key = (detect_language(request.message, request.language).language, normalize_question(request.message))
+    # A follow-up's answer depends on the session's history
+    return (request.session_id,) + key if conversation_context and is_follow_up(request.message) else key
+
+async def answer_batch(requests: List[ChatRequest]):
+    # Yields (item indexes, Answer or exception) as each distinct question finishes.
+    # Identical questions are answered once, with at most CHAT_BATCH_CONCURRENCY in flight.
+    groups: dict = {}
+    for index, request in enumerate(requests):
+        groups.setdefault(batch_key(request), []).append(index)
+    semaphore = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+
+    async def answer_group(indexes: List[int]) -> tuple:
+        request = requests[indexes[0]]
+        async with semaphore:
+            try:
+                return indexes, await answer_question(request.message, request.session_id, request.language)
+            except Exception as e:
+                return indexes, e
+
+    tasks = [asyncio.create_task(answer_group(indexes)) for indexes in groups.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def batch_results(requests: List[ChatRequest], indexes: List[int], outcome) -> tuple:
+    # Returns (ChatBatchItems, ChatMessage docs to store) for one answered question
+    if isinstance(outcome, LLMOverloaded):
+        items = [ChatBatchItem(index=i, status=outcome.status_code, detail=outcome.detail,
+                               retry_after=outcome.retry_after) for i in indexes]
+        return items, []
+    if isinstance(outcome, Exception):
+        logging.error(f"Error in chat batch item: {outcome}")
+        items = [ChatBatchItem(index=i, status=500, detail="Failed to process chat message") for i in indexes]
+        return items, []
+
+    items, docs = [], []
+    for i in indexes:
+        chat_message = ChatMessage(
+            session_id=requests[i].session_id,
+            message=requests[i].message,
+            response=outcome.text,
+            language=requests[i].language,
+            source=outcome.source
+        )
+        items.append(ChatBatchItem(index=i, status=200, id=chat_message.id, response=outcome.text,
+                                   timestamp=chat_message.timestamp, source=outcome.source))
+        docs.append(chat_message.dict())
+    return items, docs
+
+async def save_chat_batch(docs: List[dict]) -> int:
+    # One insert for the whole batch; whatever it couldn't write goes to the
+    # write-behind buffer, which retries. Returns how many were written here.
+    if not docs:
+        return 0
+    started = time.perf_counter()
+    try:
+        await db.chat_messages.insert_many(docs, ordered=True)
+        return len(docs)
+    except Exception as e:
+        inserted = e.details.get("nInserted", 0) if isinstance(e, BulkWriteError) else 0
+        logging.error(f"Error saving chat batch, queueing {len(docs) - inserted} messages: {e}")
+        for doc in docs[inserted:]:
+            await chat_writer.add(doc)
+        return inserted
+    finally:
+        MONGO_INSERT_SECONDS.observe(time.perf_counter() - started)
+
+@api_router.post("/chat/batch", response_model=ChatBatchResponse, response_model_exclude_none=True)
+async def chat_batch(batch: ChatBatchRequest, stream: bool = False):
+    # Per-item status codes: one failed question doesn't fail the batch
+    if stream:
+        if lifecycle.draining:
+            raise HTTPException(status_code=503, detail="Server is shutting down", headers={"Retry-After": "1"})
+        return StreamingResponse(stream_chat_batch(batch.requests), media_type="application/x-ndjson")
+    async with lifecycle.track_chat():
+        results, docs = [], []
+        async for indexes, outcome in answer_batch(batch.requests):
+            items, item_docs = batch_results(batch.requests, indexes, outcome)
+            results.extend(items)
+            docs.extend(item_docs)
+        saved = await save_chat_batch(docs)
+        results.sort(key=lambda item: item.index)
+        return ChatBatchResponse(results=results, saved=saved, queued=len(docs) - saved)
+
+async def stream_chat_batch(requests: List[ChatRequest]):
+    # One NDJSON line per item as it finishes, then a summary line once results are stored.
+    # Like /chat/stream, nothing is stored if the client disconnects first.
+    async with lifecycle.track_chat():
+        docs = []
+        async for indexes, outcome in answer_batch(requests):
+            items, item_docs = batch_results(requests, indexes, outcome)
+            docs.extend(item_docs)
+            yield "".join(item.json(exclude_none=True) + "\n" for item in items)
+        saved = await save_chat_batch(docs)
+        yield json.dumps({"done": True, "saved": saved, "queued": len(docs) - saved}) + "\n"
+
 @api_router.get("/faq/{language}")
-async def get_faq(language: str):
-    if language not in FAQ_DATA:
+async def get_faq(language: str, request: Request):
+    payload = faq_store.payloads.get(language)
+    if payload is None:
         raise HTTPException(status_code=400, detail="Language not supported")
-    return FAQ_DATA[language]
+
+    # Each encoding is its own representation, so each gets its own strong ETag
+    encoding = choose_encoding(
+        request.headers.get("accept-encoding", ""),
+        ["br", "gzip"] if payload.brotli_body is not None else ["gzip"]
+    )
+    body = {"br": payload.brotli_body, "gzip": payload.gzip_body}.get(encoding, payload.body)
+    etag = f'"{payload.etag}-{encoding}"' if encoding else f'"{payload.etag}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={FAQ_CACHE_MAX_AGE}, must-revalidate",
+        "Vary": "Accept-Encoding"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, [etag]):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.post("/faq/reload", dependencies=[Depends(require_admin_token)])
+async def reload_faq():
+    reloaded = await faq_store.reload()
+    return {"reloaded": reloaded, "languages": {language: len(items) for language, items in faq_store.data.items()}}
+
+@api_router.get("/stats")
+async def get_stats():
+    return {
+        "response_cache": response_cache.stats() if response_cache else None,
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_breaker": llm_breaker.stats(),
+        "llm_retries": llm_retry_budget.stats(),
+        "chat_writer": chat_writer.stats(),
+        "faq_matcher": faq_store.matcher.stats() if faq_store.matcher else None,
+        "conversation_context": conversation_context.stats() if conversation_context else None,
+        "chat_rollups": chat_rollups.stats()
+    }
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    # Component counters from /api/stats, flattened into gauges
+    for component, values in (await get_stats()).items():
+        for key, value in (values or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"kisan_vani_{component}_{key} {value}")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# Chat history
+CHAT_HISTORY_PROJECTION = {"_id": 0, "id": 1, "message": 1, "response": 1, "timestamp": 1, "language": 1}
+
+def encode_history_cursor(msg: dict) -> str:
+    raw = json.dumps([msg["timestamp"].isoformat(), msg["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_history_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, message_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), str(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_chat_history(session_id: str, limit: int, before: Optional[str] = None,
+                             after: Optional[str] = None) -> tuple:
+    # Returns (messages oldest first, whether more exist in the direction paged).
+    # Every query is an index seek on (session_id, timestamp, id) plus `limit`
+    # documents, so page cost does not depend on how long the session is.
+    query = {"session_id": session_id}
+    cursor_value = decode_history_cursor(after or before) if (after or before) else None
+    if cursor_value:
+        timestamp, message_id = cursor_value
+        op = "$gt" if after else "$lt"
+        query["$or"] = [
+            {"timestamp": {op: timestamp}},
+            {"timestamp": timestamp, "id": {op: message_id}}
+        ]
+
+    direction = 1 if after else -1
+    started = time.perf_counter()
+    messages = await db.chat_messages.find(query, CHAT_HISTORY_PROJECTION).sort(
+        [("timestamp", direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    observe_stage("history", HISTORY_QUERY_SECONDS, time.perf_counter() - started)
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if direction == -1:
+        messages.reverse()
+    return messages, has_more
 
 @api_router.get("/chat-history/{session_id}")
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None
+):
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
     try:
-        messages = await db.chat_messages.find(
-            {"session_id": session_id}
-        ).sort("timestamp", 1).to_list(100)
-        
+        # Read-your-writes: make sure this session's buffered messages are in Mongo
+        if chat_writer.has_pending(session_id):
+            await chat_writer.flush()
+        messages, has_more = await fetch_chat_history(session_id, limit, before, after)
+
+        # Cursors travel in headers so the body stays the plain list clients expect.
+        # X-Prev-Cursor pages to older messages, X-Next-Cursor to newer ones.
+        if messages:
+            if after or has_more:
+                response.headers["X-Prev-Cursor"] = encode_history_cursor(messages[0])
+            response.headers["X-Next-Cursor"] = encode_history_cursor(messages[-1])
+        elif after:
+            response.headers["X-Next-Cursor"] = after
+
         return [
             {
                 "id": msg["id"],
@@ -230,21 +1922,244 @@ async def get_chat_history(session_id: str):
             }
             for msg in messages
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error fetching chat history: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch chat history")
 
-# Include the router in the main app
-app.include_router(api_router)
+# Chat export and analytics
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+EXPORT_PROJECTION = {
+    "_id": 0, "id": 1, "session_id": 1, "message": 1, "response": 1,
+    "language": 1, "source": 1, "question_key": 1, "timestamp": 1
+}
+ANALYTICS_ROLLUP_ENABLED = os.environ.get('ANALYTICS_ROLLUP_ENABLED', 'true').lower() == 'true'
+ANALYTICS_ROLLUP_INTERVAL_SECONDS = float(os.environ.get('ANALYTICS_ROLLUP_INTERVAL_SECONDS', '900'))
+ANALYTICS_ROLLUP_BACKFILL_DAYS = int(os.environ.get('ANALYTICS_ROLLUP_BACKFILL_DAYS', '30'))
+ANALYTICS_TOP_QUESTIONS = int(os.environ.get('ANALYTICS_TOP_QUESTIONS', '20'))
+# Days are bucketed in local time (IST by default) so a dashboard day matches the farmer's day
+ANALYTICS_UTC_OFFSET_MINUTES = int(os.environ.get('ANALYTICS_UTC_OFFSET_MINUTES', '330'))
+
+class ChatRollups:
+    # Daily aggregates of chat_messages, one small document per local day, so
+    # dashboards never scan the message collection themselves
+    def __init__(self, collection_name: str, top_questions: int, utc_offset_minutes: int,
+                 backfill_days: int, lease_seconds: float):
+        self.collection_name = collection_name
+        self.top_questions = top_questions
+        self.offset = timedelta(minutes=utc_offset_minutes)
+        self.backfill_days = backfill_days
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self.runs = 0
+        self.skipped_runs = 0
+        self.failed_runs = 0
+        self.days_rolled = 0
+        self.last_run_seconds = 0.0
+
+    def today(self) -> date:
+        return (datetime.now(timezone.utc) + self.offset).date()
+
+    def day_bounds(self, day: date) -> tuple:
+        start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) - self.offset
+        return start, start + timedelta(days=1)
+
+    async def rollup_day(self, day: date) -> dict:
+        start, end = self.day_bounds(day)
+        # One pass over the day's range of the timestamp index
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+            {"$facet": {
+                "by_language": [{"$group": {"_id": "$language", "count": {"$sum": 1}}}],
+                "by_source": [{"$group": {"_id": {"$ifNull": ["$source", "llm"]}, "count": {"$sum": 1}}}],
+                "top_questions": [
+                    {"$group": {
+                        "_id": {
+                            "language": "$language",
+                            # Messages stored before question_key existed fall back to lowercase text
+                            "question": {"$ifNull": ["$question_key", {"$toLower": "$message"}]}
+                        },
+                        "count": {"$sum": 1}
+                    }},
+                    {"$sort": {"count": -1}},
+                    {"$limit": self.top_questions}
+                ]
+            }}
+        ]
+        result = await db.chat_messages.aggregate(pipeline, allowDiskUse=True).to_list(1)
+        facets = result[0] if result else {}
+        rollup = summarize_rollup(
+            {row["_id"] or "unknown": row["count"] for row in facets.get("by_language", [])},
+            {row["_id"]: row["count"] for row in facets.get("by_source", [])},
+            [{**row["_id"], "count": row["count"]} for row in facets.get("top_questions", [])]
+        )
+        rollup.update({"date": day.isoformat(), "updated_at": datetime.now(timezone.utc)})
+        await db[self.collection_name].replace_one({"_id": day.isoformat()}, rollup, upsert=True)
+        return rollup
+
+    async def _acquire_lease(self) -> bool:
+        # Every worker runs the loop; the lease lets only one of them do the work per interval
+        now = datetime.now(timezone.utc)
+        try:
+            await db.job_leases.update_one(
+                {"_id": "chat_rollups", "expires_at": {"$lte": now}},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def run_once(self) -> List[str]:
+        started = time.perf_counter()
+        try:
+            # Inside the try so a Mongo outage fails this run, not the watch loop
+            if not await self._acquire_lease():
+                self.skipped_runs += 1
+                return []
+            today = self.today()
+            first = today - timedelta(days=self.backfill_days - 1)
+            done = set(await db[self.collection_name].distinct("_id", {"_id": {"$gte": first.isoformat()}}))
+            # Today is still filling up and yesterday can receive late buffered writes
+            days = []
+            for i in range(self.backfill_days):
+                day = first + timedelta(days=i)
+                if day.isoformat() not in done or day >= today - timedelta(days=1):
+                    days.append(day)
+            for day in days:
+                await self.rollup_day(day)
+            self.runs += 1
+            self.days_rolled += len(days)
+            return [day.isoformat() for day in days]
+        except Exception as e:
+            self.failed_runs += 1
+            logging.error(f"Error rolling up chat analytics: {e}")
+            return []
+        finally:
+            self.last_run_seconds = round(time.perf_counter() - started, 4)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
+    async def watch(self, interval: float):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(interval)
+
+    async def read(self, since: date, until: date, period: str) -> List[dict]:
+        rollups = await db[self.collection_name].find(
+            {"_id": {"$gte": since.isoformat(), "$lte": until.isoformat()}}, {"_id": 0}
+        ).sort("_id", 1).to_list(None)
+        if period == "day":
+            return rollups
+        weeks: dict = {}
+        for rollup in rollups:
+            day = date.fromisoformat(rollup["date"])
+            weeks.setdefault((day - timedelta(days=day.weekday())).isoformat(), []).append(rollup)
+        return [{"week": week, **merge_rollups(days, self.top_questions)} for week, days in weeks.items()]
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "failed_runs": self.failed_runs,
+            "days_rolled": self.days_rolled,
+            "last_run_seconds": self.last_run_seconds
+        }
+
+def summarize_rollup(by_language: dict, by_source: dict, top_questions: List[dict]) -> dict:
+    total = sum(by_language.values())
+    return {
+        "total": total,
+        "by_language": by_language,
+        "by_source": by_source,
+        # Fallback answers are what farmers see when the LLM call fails
+        "fallback_rate": round(by_source.get("fallback", 0) / total, 4) if total else 0.0,
+        "top_questions": top_questions
+    }
+
+def merge_rollups(rollups: List[dict], top_questions: int) -> dict:
+    by_language: dict = {}
+    by_source: dict = {}
+    questions: dict = {}
+    for rollup in rollups:
+        for language, count in rollup["by_language"].items():
+            by_language[language] = by_language.get(language, 0) + count
+        for source, count in rollup["by_source"].items():
+            by_source[source] = by_source.get(source, 0) + count
+        # Approximate: a question outside every day's top list is not counted
+        for row in rollup["top_questions"]:
+            key = (row["language"], row["question"])
+            questions[key] = questions.get(key, 0) + row["count"]
+    top = heapq.nlargest(top_questions, questions.items(), key=lambda item: item[1])
+    return summarize_rollup(
+        by_language,
+        by_source,
+        [{"language": language, "question": question, "count": count} for (language, question), count in top]
+    )
+
+chat_rollups = ChatRollups(
+    "chat_rollups_daily",
+    ANALYTICS_TOP_QUESTIONS,
+    ANALYTICS_UTC_OFFSET_MINUTES,
+    ANALYTICS_ROLLUP_BACKFILL_DAYS,
+    ANALYTICS_ROLLUP_INTERVAL_SECONDS
 )
 
+@api_router.get("/export/chat-messages", dependencies=[Depends(require_admin_token)])
+async def export_chat_messages(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    language: Optional[str] = None,
+    session_id: Optional[str] = None
+):
+    query: dict = {}
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if language:
+        query["language"] = language
+    if session_id:
+        query["session_id"] = session_id
+
+    async def rows():
+        # NDJSON straight off the Mongo cursor: memory stays at one batch however big the export
+        cursor = db.chat_messages.find(query, EXPORT_PROJECTION).sort(
+            [("timestamp", 1), ("id", 1)]
+        ).batch_size(EXPORT_BATCH_SIZE)
+        lines = []
+        async for doc in cursor:
+            doc["timestamp"] = doc["timestamp"].isoformat()
+            lines.append(json.dumps(doc, ensure_ascii=False))
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="chat-messages.ndjson"'}
+    )
+
+@api_router.get("/analytics/rollups", dependencies=[Depends(require_admin_token)])
+async def get_chat_rollups(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    period: str = Query("day", pattern="^(day|week)$")
+):
+    until = until or chat_rollups.today()
+    since = since or until - timedelta(days=ANALYTICS_ROLLUP_BACKFILL_DAYS - 1)
+    if since > until or (until - since).days > 366:
+        raise HTTPException(status_code=400, detail="Date range must be between 1 and 367 days")
+    try:
+        return await chat_rollups.read(since, until, period)
+    except Exception as e:
+        logging.error(f"Error reading chat rollups: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read analytics")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -252,6 +2167,151 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+# Lifecycle
+# uvicorn only runs lifespan shutdown after it has closed its listening sockets and
+# waited for in-flight requests (bounded by --timeout-graceful-shutdown), so by then
+# readiness and the 503 + Retry-After can no longer steer traffic. Draining therefore
+# starts from a pre-stop hook that calls POST /api/health/drain before SIGTERM:
+# readiness turns 503 so the load balancer stops routing here, new chats are refused
+# with Retry-After, and the call returns once in-flight chats finish or
+# SHUTDOWN_DRAIN_SECONDS pass. Run uvicorn with --timeout-graceful-shutdown so a
+# stuck request can't hold the worker after SIGTERM either.
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', '20'))
+RESPONSE_CACHE_WARM_ENTRIES = int(os.environ.get('RESPONSE_CACHE_WARM_ENTRIES', '500'))
+
+class Lifecycle:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Each lifespan startup begins a fresh cycle (the module outlives app instances)
+        self.ready = False
+        self.draining = False
+        self.active_chats = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @asynccontextmanager
+    async def track_chat(self):
+        if self.draining:
+            raise HTTPException(status_code=503, detail="Server is shutting down", headers={"Retry-After": "1"})
+        self.active_chats += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.active_chats -= 1
+            if not self.active_chats:
+                self._idle.set()
+
+    async def drain(self, timeout: float):
+        self.ready = False
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Shutting down with {self.active_chats} chats still in flight")
+
+lifecycle = Lifecycle()
+faq_reload_task: Optional[asyncio.Task] = None
+chat_rollups_task: Optional[asyncio.Task] = None
+
+async def startup_db_client(mongo_client: Optional[AsyncIOMotorClient] = None):
+    global client, db, faq_reload_task, chat_rollups_task
+    lifecycle.reset()
+    client = mongo_client or AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS
+    )
+    db = client[os.environ['DB_NAME']]
+
+    # Everything below runs before the worker accepts traffic
+    await faq_store.reload()
+    if faq_store.source != "builtin":
+        faq_reload_task = asyncio.create_task(faq_store.watch(FAQ_RELOAD_INTERVAL_SECONDS))
+    try:
+        await db.chat_messages.create_index(
+            [("session_id", 1), ("timestamp", 1), ("id", 1)],
+            name="session_id_timestamp"
+        )
+        # Export order and the daily rollup $match both range over timestamp
+        await db.chat_messages.create_index([("timestamp", 1), ("id", 1)], name="timestamp_id")
+    except Exception as e:
+        logging.error(f"Error creating chat message indexes: {e}")
+    # conversation_summaries is keyed by session_id (_id), so it needs no extra index
+    if response_cache:
+        try:
+            await response_cache.ensure_indexes()
+            await response_cache.warm(RESPONSE_CACHE_WARM_ENTRIES)
+        except Exception as e:
+            logging.error(f"Error preparing response cache: {e}")
+    if ANALYTICS_ROLLUP_ENABLED:
+        chat_rollups_task = asyncio.create_task(chat_rollups.watch(ANALYTICS_ROLLUP_INTERVAL_SECONDS))
+    lifecycle.ready = True
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Normally already drained by the pre-stop hook and uvicorn's own wait; this covers
+    # servers that run shutdown first, then flushes what the last chats queued
+    await lifecycle.drain(SHUTDOWN_DRAIN_SECONDS)
+    for task in (faq_reload_task, chat_rollups_task):
+        if task:
+            task.cancel()
+    await chat_writer.close()
+    if client:
+        client.close()
+
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@api_router.post("/health/drain", dependencies=[Depends(require_admin_token)])
+async def drain():
+    # Pre-stop hook: stop taking chats while the listener is still open
+    await lifecycle.drain(SHUTDOWN_DRAIN_SECONDS)
+    return {"status": "drained" if not lifecycle.active_chats else "timed_out", "active_chats": lifecycle.active_chats}
+
+@api_router.get("/health/ready")
+async def readiness(response: Response):
+    if not lifecycle.ready:
+        response.status_code = 503
+        return {"status": "draining" if lifecycle.draining else "starting"}
+    try:
+        await db.command("ping")
+    except Exception as e:
+        logging.error(f"Readiness check failed: {e}")
+        response.status_code = 503
+        return {"status": "mongo_unavailable"}
+    # An open breaker degrades answers but doesn't take the worker out of rotation
+    return {"status": "ready", "active_chats": lifecycle.active_chats, "llm": llm_breaker.state}
+
+def create_app(mongo_client: Optional[AsyncIOMotorClient] = None) -> FastAPI:
+    # Each uvicorn/gunicorn worker imports this module and runs its own lifespan, so
+    # Mongo pools and in-memory caches are per worker; the response cache's Mongo tier
+    # and conversation summaries are what workers share
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await startup_db_client(mongo_client)
+        yield
+        await shutdown_db_client()
+
+    # Create the main app without a prefix
+    app = FastAPI(lifespan=lifespan)
+
+    # Include the router in the main app
+    app.include_router(api_router)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Prev-Cursor", "X-Next-Cursor", "ETag", "Server-Timing"],
+    )
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+app = create_app()
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import math
+import random
+import sys
+import time
+import timeit
+import types
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+
+def legacy_contains_malayalam(message):
+    """Language check used by get_ai_response before the language router"""
+    return any(char in message for char in 'അആഇഈഉഊഋഌഎഏഐഒഓഔകഖഗഘങചഛജഝടതഥദധനപഫബഭമയരലവശഷസഹളഴറ')
+
+
+def language_samples(length):
+    english = "How much neem oil should I spray per acre for aphids on my brinjal crop? "
+    malayalam = "വഴുതനയിലെ മൺകീടത്തിന് ഏക്കറിന് എത്ര വേപ്പെണ്ണ തളിക്കണം? "
+    return {
+        "english": (english * (length // len(english) + 1))[:length],
+        "malayalam": (malayalam * (length // len(malayalam) + 1))[:length],
+        # Malayalam only at the very end is the worst case for an early-exit scan
+        "english_malayalam_tail": (english * (length // len(english) + 1))[:length - 4] + "വളം?",
+        "mixed": ((english + malayalam) * (length // len(english + malayalam) + 1))[:length],
+        # Malayalam digits and chillu letters that the legacy letter list does not contain
+        "english_malayalam_digits": (english * (length // len(english) + 1))[:length - 4] + "൧൦ൻ?",
+    }
+
+
+def run_language_benchmark(args):
+    detect_language = import_server().detect_language
+
+    results = []
+    for length in args.lengths:
+        for name, message in language_samples(length).items():
+            legacy = min(timeit.repeat(lambda: legacy_contains_malayalam(message), number=args.number, repeat=5))
+            router = min(timeit.repeat(lambda: detect_language(message), number=args.number, repeat=5))
+            decision = detect_language(message)
+            results.append({
+                "sample": name,
+                "length": length,
+                "legacy_us": round(legacy / args.number * 1e6, 3),
+                "router_us": round(router / args.number * 1e6, 3),
+                "legacy_malayalam": legacy_contains_malayalam(message),
+                "router_decision": decision._asdict(),
+            })
+    return {"benchmark": "language_detection", "results": results}
+
+
+class FakeLlmChat:
+    """Stand-in for LlmChat with configurable latency and chunked generation"""
+    latency = 0.2
+    jitter = 0.05
+    chunks = 1
+    chunk_delay = 0.0
+    failure_rate = 0.0
+    calls = 0
+
+    def __init__(self, api_key=None, session_id=None, system_message=None):
+        self.session_id = session_id
+        self.system_message = system_message
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, user_message):
+        FakeLlmChat.calls += 1
+        # Time to first token, then one delay per remaining chunk
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        for _ in range(self.chunks - 1):
+            await asyncio.sleep(self.chunk_delay)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("fake upstream failure")
+        return f"Stub answer ({len(user_message.text)} chars of prompt)"
+
+
+class FakeUserMessage:
+    def __init__(self, text):
+        self.text = text
+
+
+def import_server():
+    """Import backend/server.py, with the fake LLM if emergentintegrations isn't installed"""
+    # The real emergentintegrations package is only needed to import server.py
+    try:
+        import emergentintegrations.llm.chat  # noqa: F401
+    except ImportError:
+        chat_module = types.ModuleType("emergentintegrations.llm.chat")
+        chat_module.LlmChat = FakeLlmChat
+        chat_module.UserMessage = FakeUserMessage
+        sys.modules["emergentintegrations"] = types.ModuleType("emergentintegrations")
+        sys.modules["emergentintegrations.llm"] = types.ModuleType("emergentintegrations.llm")
+        sys.modules["emergentintegrations.llm.chat"] = chat_module
+
+    import server
+    return server
+
+
+def import_server_offline():
+    """Import backend/server.py with the fake LLM; returns it with an in-memory Mongo client"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("The load benchmark needs mongomock-motor: pip install mongomock-motor")
+
+    server = import_server()
+    # Per-request httpx logging would dominate the run
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server.LlmChat = FakeLlmChat
+    return server, AsyncMongoMockClient()
+
+
+BENCHMARK_QUESTIONS = [
+    ("What is PM-KISAN scheme?", "english"),
+    ("How much neem oil should I spray per acre for aphids?", "english"),
+    ("What is the PMFBY premium for small farmers?", "english"),
+    ("How to manage pest attacks on crops?", "english"),
+    ("പിഎം-കിസാൻ പദ്ധതി എന്താണ്?", "malayalam"),
+    ("വാഴയിലെ ഇലപ്പുള്ളി രോഗം എങ്ങനെ നിയന്ത്രിക്കാം?", "malayalam"),
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Nearest rank: the smallest value with at least `fraction` of the samples at or below it
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(name, latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        "scenario": name,
+        "requests": len(statuses),
+        "errors": sum(1 for status in statuses if status >= 400),
+        "status_counts": status_counts,
+        "requests_per_second": round(len(statuses) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def drive(http, name, total, concurrency, make_request):
+    latencies, statuses = [], []
+    remaining = iter(range(total))
+
+    async def worker():
+        for i in remaining:
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                statuses.append(response.status_code)
+            except Exception:
+                statuses.append(599)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, statuses, time.perf_counter() - started)
+
+
+async def run_load(args):
+    import httpx
+
+    server, mongo_client = import_server_offline()
+    FakeLlmChat.latency = args.llm_latency_ms / 1000
+    FakeLlmChat.jitter = args.llm_jitter_ms / 1000
+    FakeLlmChat.chunks = args.llm_chunks
+    FakeLlmChat.chunk_delay = args.llm_chunk_delay_ms / 1000
+    FakeLlmChat.failure_rate = args.llm_failure_rate
+    if args.no_cache:
+        server.response_cache = None
+
+    random.seed(args.seed)
+    sessions = [f"bench_{uuid.uuid4().hex[:8]}" for _ in range(args.sessions)]
+
+    def chat_payload(i):
+        if random.random() < args.unique_ratio:
+            return {"message": f"How do I grow variety {i} of paddy in Kuttanad?", "language": "english"}
+        message, language = random.choice(BENCHMARK_QUESTIONS)
+        return {"message": message, "language": language}
+
+    scenarios = []
+    app = server.create_app(mongo_client=mongo_client)
+    # httpx's ASGI transport doesn't run lifespan events, so run them around the scenarios
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as http:
+            scenarios.append(await drive(
+                http, "chat", args.requests, args.concurrency,
+                lambda i: http.post("/api/chat", json={**chat_payload(i), "session_id": sessions[i % len(sessions)]})
+            ))
+            scenarios.append(await drive(
+                http, "chat_history", args.requests, args.concurrency,
+                lambda i: http.get(f"/api/chat-history/{sessions[i % len(sessions)]}", params={"limit": 20})
+            ))
+            scenarios.append(await drive(
+                http, "faq", args.requests, args.concurrency,
+                lambda i: http.get(f"/api/faq/{'english' if i % 2 else 'malayalam'}", headers={"Accept-Encoding": "gzip"})
+            ))
+            stats = (await http.get("/api/stats")).json()
+
+    return {
+        "benchmark": "load",
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "sessions": args.sessions,
+            "unique_ratio": args.unique_ratio,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "llm_chunks": args.llm_chunks,
+            "llm_chunk_delay_ms": args.llm_chunk_delay_ms,
+            "llm_failure_rate": args.llm_failure_rate,
+            "response_cache": not args.no_cache,
+        },
+        "upstream_calls": FakeLlmChat.calls,
+        "scenarios": scenarios,
+        "server_stats": stats,
+    }
+
+
+def find_regressions(report, baseline, max_regression):
+    """Compare p95 latency and throughput per scenario against a previous report"""
+    previous = {scenario["scenario"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in report.get("scenarios", []):
+        before = previous.get(scenario["scenario"])
+        if not before:
+            continue
+        if scenario["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + max_regression):
+            regressions.append(f"{scenario['scenario']}: p95 {before['latency_ms']['p95']}ms -> {scenario['latency_ms']['p95']}ms")
+        if scenario["requests_per_second"] < before["requests_per_second"] * (1 - max_regression):
+            regressions.append(f"{scenario['scenario']}: {before['requests_per_second']} -> {scenario['requests_per_second']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kisan Vani backend benchmarks")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    language = subparsers.add_parser("language", parents=[common], help="Malayalam detection: legacy scan vs language router")
+    language.add_argument("--lengths", type=int, nargs="+", default=[100, 2000, 20000])
+    language.add_argument("--number", type=int, default=200)
+    language.set_defaults(func=run_language_benchmark)
+
+    load = subparsers.add_parser("load", parents=[common], help="In-process load test with a stub LLM and in-memory Mongo")
+    load.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    load.add_argument("--concurrency", type=int, default=50)
+    load.add_argument("--sessions", type=int, default=25)
+    load.add_argument("--unique-ratio", type=float, default=0.5, help="Share of chat questions that never repeat")
+    load.add_argument("--llm-latency-ms", type=float, default=200.0, help="Stub time to first token")
+    load.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    load.add_argument("--llm-chunks", type=int, default=1, help="Stub chunks per answer")
+    load.add_argument("--llm-chunk-delay-ms", type=float, default=0.0)
+    load.add_argument("--llm-failure-rate", type=float, default=0.0)
+    load.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--baseline", help="Previous JSON report to compare against")
+    load.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative p95/throughput regression")
+    load.set_defaults(func=lambda args: asyncio.run(run_load(args)))
+
+    args = parser.parse_args()
+
+    report = args.func(args)
+    regressions = []
+    if getattr(args, "baseline", None):
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = find_regressions(report, baseline, args.max_regression)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "benchmark")
+    sys.exit(main())
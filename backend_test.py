@@ -1,4 +1,5 @@
 import requests
+import os
 import sys
 import json
 from datetime import datetime
@@ -10,12 +11,16 @@ class KisanVaniAPITester:
         self.api_url = f"{base_url}/api"
         self.tests_run = 0
         self.tests_passed = 0
+        # Admin endpoints answer 403 unless the server has ADMIN_TOKEN configured
+        self.admin_token = os.environ.get("ADMIN_TOKEN")
         self.session_id = f"test_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, timeout=30):
+    def run_test(self, name, method, endpoint, expected_status, data=None, timeout=30, admin=False):
         """Run a single API test"""
         url = f"{self.api_url}/{endpoint}" if endpoint else self.api_url
         headers = {'Content-Type': 'application/json'}
+        if admin and self.admin_token:
+            headers['X-Admin-Token'] = self.admin_token
 
         self.tests_run += 1
         print(f"\n🔍 Testing {name}...")
@@ -61,6 +66,14 @@ class KisanVaniAPITester:
         """Test the root API endpoint"""
         return self.run_test("Root API Endpoint", "GET", "", 200)
 
+    def test_health_live(self):
+        """Test liveness endpoint"""
+        return self.run_test("Liveness", "GET", "health/live", 200)
+
+    def test_health_ready(self):
+        """Test readiness endpoint (checks MongoDB)"""
+        return self.run_test("Readiness", "GET", "health/ready", 200)
+
     def test_faq_english(self):
         """Test English FAQ endpoint"""
         success, response = self.run_test("English FAQ", "GET", "faq/english", 200)
@@ -109,6 +122,38 @@ class KisanVaniAPITester:
             return response.get('id') is not None
         return False
 
+    def test_chat_stream(self):
+        """Test streaming chat endpoint (Server-Sent Events)"""
+        url = f"{self.api_url}/chat/stream"
+        chat_data = {
+            "message": "How to use neem oil for aphids?",
+            "session_id": self.session_id,
+            "language": "english"
+        }
+
+        self.tests_run += 1
+        print(f"\n🔍 Testing Streaming Chat...")
+        print(f"   URL: {url}")
+
+        try:
+            with requests.post(url, json=chat_data, stream=True, timeout=60) as response:
+                print(f"   Status Code: {response.status_code}")
+                events = [
+                    line[len("event: "):]
+                    for line in response.iter_lines(decode_unicode=True)
+                    if line and line.startswith("event: ")
+                ]
+            print(f"   Received {len(events)} events")
+            if response.status_code == 200 and events and events[0] == "start" and events[-1] == "done":
+                self.tests_passed += 1
+                print(f"✅ PASSED - Streaming Chat")
+                return True
+            print(f"❌ FAILED - Streaming Chat - expected start ... done events, got: {events[:3]}")
+            return False
+        except Exception as e:
+            print(f"❌ FAILED - Streaming Chat - Error: {str(e)}")
+            return False
+
     def test_chat_empty_message(self):
         """Test chat with empty message"""
         chat_data = {
@@ -128,6 +173,46 @@ class KisanVaniAPITester:
             return True
         return success
 
+    def test_chat_history_pagination(self):
+        """Test chat history limit parameter"""
+        success, response = self.run_test("Chat History Pagination", "GET", f"chat-history/{self.session_id}?limit=1", 200)
+        if success and isinstance(response, list):
+            print(f"   Found {len(response)} chat messages with limit=1")
+            return len(response) <= 1
+        return success
+
+    def test_chat_batch(self):
+        """Test batch chat with a duplicate question"""
+        batch_data = {"requests": [
+            {"message": "What is PM-KISAN scheme?", "session_id": self.session_id, "language": "english"},
+            {"message": "What is PM-KISAN scheme?", "session_id": self.session_id, "language": "english"},
+            {"message": "How to manage pest attacks on crops?", "session_id": self.session_id, "language": "english"}
+        ]}
+        success, response = self.run_test("Batch Chat", "POST", "chat/batch", 200, batch_data, timeout=90)
+        if success and isinstance(response, dict):
+            results = response.get("results", [])
+            print(f"   Got {len(results)} results, saved {response.get('saved')}")
+            return [item["index"] for item in results] == [0, 1, 2] and all(item["status"] == 200 for item in results)
+        return success
+
+    def test_chat_export(self):
+        """Test NDJSON export of this session's messages"""
+        expected = 200 if self.admin_token else 403
+        success, response = self.run_test("Chat Export", "GET", f"export/chat-messages?session_id={self.session_id}", expected, admin=True)
+        if success and isinstance(response, str):
+            rows = [json.loads(line) for line in response.splitlines() if line]
+            print(f"   Exported {len(rows)} chat messages")
+            return all(row["session_id"] == self.session_id for row in rows)
+        return success
+
+    def test_analytics_rollups(self):
+        """Test daily analytics rollups"""
+        expected = 200 if self.admin_token else 403
+        success, response = self.run_test("Analytics Rollups", "GET", "analytics/rollups?period=week", expected, admin=True)
+        if success and isinstance(response, list):
+            print(f"   Found {len(response)} weekly rollups")
+        return success
+
     def test_chat_history_invalid_session(self):
         """Test chat history with invalid session ID"""
         invalid_session = "invalid_session_id"
@@ -147,14 +232,21 @@ def main():
     # Test sequence
     tests = [
         ("Root API Endpoint", tester.test_root_endpoint),
+        ("Liveness", tester.test_health_live),
+        ("Readiness", tester.test_health_ready),
         ("English FAQ", tester.test_faq_english),
         ("Malayalam FAQ", tester.test_faq_malayalam),
         ("Invalid Language FAQ", tester.test_faq_invalid_language),
         ("English Chat", tester.test_chat_english),
         ("Malayalam Chat", tester.test_chat_malayalam),
+        ("Streaming Chat", tester.test_chat_stream),
+        ("Batch Chat", tester.test_chat_batch),
         ("Empty Message Chat", tester.test_chat_empty_message),
         ("Chat History", tester.test_chat_history),
+        ("Chat History Pagination", tester.test_chat_history_pagination),
         ("Invalid Session Chat History", tester.test_chat_history_invalid_session),
+        ("Chat Export", tester.test_chat_export),
+        ("Analytics Rollups", tester.test_analytics_rollups),
     ]
     
     print(f"\n📋 Running {len(tests)} API tests...")
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import types
+
+import httpx
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+from server import Answer, LLMOverloaded
+
+# Not follow-ups, so copies from different sessions share one answer
+BUSY = "busy: which fertilizer suits coconut palms?"
+DOWN = "down: which fertilizer suits banana plants?"
+
+
+class FakeCollection:
+    def __init__(self, fail_times=0, partial=0):
+        self.docs = []
+        self.fail_times = fail_times
+        self.partial = partial
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail_times:
+            self.fail_times -= 1
+            self.docs.extend(docs[:self.partial])
+            raise BulkWriteError({"nInserted": self.partial, "writeErrors": []})
+        self.docs.extend(docs)
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.docs = []
+
+    async def add(self, doc):
+        self.docs.append(doc)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def answer_question(message, session_id, language):
+        calls.append(message)
+        if message == BUSY:
+            raise LLMOverloaded(429, "Too many requests", 2)
+        if message == DOWN:
+            raise LLMOverloaded(503, "AI service unavailable", 5)
+        await asyncio.sleep(0)
+        return Answer(f"answer to {message}", "llm")
+
+    monkeypatch.setattr(server, "answer_question", answer_question)
+    return calls
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(server, "chat_writer", writer)
+    return writer
+
+
+def use_collection(monkeypatch, collection):
+    monkeypatch.setattr(server, "db", types.SimpleNamespace(chat_messages=collection))
+    return collection
+
+
+def post_batch(messages, stream=False):
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/chat/batch",
+                params={"stream": "true"} if stream else None,
+                json={"requests": [{"message": message, "session_id": session} for message, session in messages]},
+            )
+    return asyncio.run(scenario())
+
+
+def test_identical_questions_are_answered_once_and_stored_per_item(monkeypatch, calls, writer):
+    collection = use_collection(monkeypatch, FakeCollection())
+    response = post_batch([("What is PM-KISAN?", "a"), ("what is pm-kisan", "b"), ("Neem oil dose?", "a")])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert sorted(calls) == ["Neem oil dose?", "What is PM-KISAN?"]
+    assert [item["status"] for item in body["results"]] == [200, 200, 200]
+    assert body["results"][0]["response"] == body["results"][1]["response"]
+    assert (body["saved"], body["queued"]) == (3, 0)
+    stored = {doc["id"]: doc for doc in collection.docs}
+    assert sorted(stored) == sorted(item["id"] for item in body["results"])
+    assert sorted(doc["session_id"] for doc in stored.values()) == ["a", "a", "b"]
+
+
+@pytest.mark.parametrize("message, status, retry_after", [(BUSY, 429, 2), (DOWN, 503, 5)])
+def test_overload_fails_only_that_groups_items(monkeypatch, calls, writer, message, status, retry_after):
+    collection = use_collection(monkeypatch, FakeCollection())
+    response = post_batch([(message, "a"), ("Neem oil dose?", "a"), (message, "b")])
+
+    results = response.json()["results"]
+    assert calls.count(message) == 1
+    assert [item["status"] for item in results] == [status, 200, status]
+    assert results[0]["retry_after"] == retry_after and "id" not in results[0]
+    assert [doc["message"] for doc in collection.docs] == ["Neem oil dose?"]
+
+
+def test_unwritten_docs_go_to_the_chat_writer(monkeypatch, calls, writer):
+    collection = use_collection(monkeypatch, FakeCollection(fail_times=1, partial=1))
+    response = post_batch([("one", "a"), ("two", "a"), ("three", "a")])
+
+    body = response.json()
+    assert (body["saved"], body["queued"]) == (1, 2)
+    assert len(collection.docs) == 1 and len(writer.docs) == 2
+    ids = {item["id"] for item in body["results"]}
+    assert {doc["id"] for doc in collection.docs + writer.docs} == ids
+
+
+def test_stream_emits_a_line_per_item_then_a_summary(monkeypatch, calls, writer):
+    collection = use_collection(monkeypatch, FakeCollection())
+    response = post_batch([("What is PM-KISAN?", "a"), (BUSY, "a"), ("what is pm-kisan", "b")], stream=True)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 4
+    assert sorted((line["index"], line["status"]) for line in lines[:3]) == [(0, 200), (1, 429), (2, 200)]
+    assert lines[3] == {"done": True, "saved": 2, "queued": 0}
+    assert len(collection.docs) == 2
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import server
+from server import encode_history_cursor
+
+AsyncMongoMockClient = pytest.importorskip("mongomock_motor").AsyncMongoMockClient
+
+START = datetime(2026, 1, 1, 6, 0, 0)
+# "b" and "c" share a timestamp, so only the id orders them
+MESSAGES = [("a", 0), ("b", 1), ("c", 1), ("d", 2), ("e", 3)]
+
+
+@pytest.fixture
+def history(monkeypatch):
+    db = AsyncMongoMockClient()["kisan_vani_test"]
+    docs = [
+        {"id": message_id, "session_id": "s", "message": f"q{message_id}", "response": f"r{message_id}",
+         "language": "english", "timestamp": START + timedelta(minutes=minute)}
+        for message_id, minute in MESSAGES
+    ]
+    docs.append({"id": "z", "session_id": "other", "message": "q", "response": "r",
+                 "language": "english", "timestamp": START})
+    asyncio.run(db.chat_messages.insert_many(docs))
+    monkeypatch.setattr(server, "db", db)
+    return {doc["id"]: doc for doc in docs}
+
+
+def get_page(**params):
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/chat-history/s", params=params)
+    return asyncio.run(scenario())
+
+
+def ids(response):
+    return [msg["id"] for msg in response.json()]
+
+
+def test_default_is_the_latest_page_oldest_first(history):
+    response = get_page(limit=2)
+    assert response.status_code == 200
+    assert ids(response) == ["d", "e"]
+    assert response.headers["X-Prev-Cursor"] == encode_history_cursor(history["d"])
+    assert response.headers["X-Next-Cursor"] == encode_history_cursor(history["e"])
+
+
+def test_whole_history_fits_without_a_prev_cursor(history):
+    response = get_page()
+    assert ids(response) == ["a", "b", "c", "d", "e"]
+    assert "X-Prev-Cursor" not in response.headers
+
+
+def test_before_pages_back_and_after_pages_forward(history):
+    older = get_page(limit=2, before=encode_history_cursor(history["d"]))
+    assert ids(older) == ["b", "c"]
+    oldest = get_page(limit=2, before=older.headers["X-Prev-Cursor"])
+    assert ids(oldest) == ["a"]
+    assert "X-Prev-Cursor" not in oldest.headers
+
+    newer = get_page(limit=2, after=oldest.headers["X-Next-Cursor"])
+    assert ids(newer) == ["b", "c"]
+    newest = get_page(limit=2, after=newer.headers["X-Next-Cursor"])
+    assert ids(newest) == ["d", "e"]
+    assert newest.headers["X-Prev-Cursor"] == encode_history_cursor(history["d"])
+
+
+def test_equal_timestamps_are_ordered_by_id(history):
+    assert ids(get_page(limit=1, before=encode_history_cursor(history["c"]))) == ["b"]
+    assert ids(get_page(limit=1, after=encode_history_cursor(history["b"]))) == ["c"]
+
+
+def test_empty_after_page_keeps_the_cursor(history):
+    cursor = encode_history_cursor(history["e"])
+    response = get_page(after=cursor)
+    assert response.json() == []
+    assert response.headers["X-Next-Cursor"] == cursor
+    assert "X-Prev-Cursor" not in response.headers
+
+
+@pytest.mark.parametrize("params", [
+    {"before": "not-a-cursor"},
+    {"after": "bm90IGpzb24"},
+    {"before": "x", "after": "y"},
+])
+def test_bad_cursors_are_rejected(history, params):
+    assert get_page(**params).status_code == 400
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+from server import ChatMessageWriter
+
+
+class FakeCollection:
+    def __init__(self, fail_times=0, partial=0):
+        self.docs = []
+        self.batches = []
+        self.fail_times = fail_times
+        self.partial = partial
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail_times:
+            self.fail_times -= 1
+            self.docs.extend(docs[:self.partial])
+            raise BulkWriteError({"nInserted": self.partial, "writeErrors": []})
+        self.batches.append(len(docs))
+        self.docs.extend(docs)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(server, "db", {"chat_messages": collection})
+    return collection
+
+
+def message(i, session_id="s"):
+    return {"id": str(i), "session_id": session_id}
+
+
+def run_writer(writer, scenario):
+    async def wrapped():
+        try:
+            await scenario()
+        finally:
+            await writer.close()
+    asyncio.run(wrapped())
+
+
+def test_flush_writes_in_batches_and_tracks_pending_sessions(collection):
+    writer = ChatMessageWriter(batch_size=2, flush_interval=60, max_pending=100, max_retries=3)
+
+    async def scenario():
+        for i in range(5):
+            await writer.add(message(i, "a" if i < 4 else "b"))
+        assert writer.has_pending("b")
+        assert await writer.flush()
+        assert not writer.has_pending("a") and not writer.has_pending("b")
+
+    run_writer(writer, scenario)
+    assert [doc["id"] for doc in collection.docs] == ["0", "1", "2", "3", "4"]
+    assert writer.stats()["written"] == 5
+
+
+def test_partial_insert_keeps_only_unwritten_messages(collection):
+    collection.fail_times, collection.partial = 1, 1
+    writer = ChatMessageWriter(batch_size=10, flush_interval=60, max_pending=100, max_retries=3)
+
+    async def scenario():
+        for i in range(3):
+            await writer.add(message(i))
+        assert not await writer.flush()
+        assert writer.stats()["pending"] == 2
+        assert await writer.flush()
+
+    run_writer(writer, scenario)
+    assert [doc["id"] for doc in collection.docs] == ["0", "1", "2"]
+
+
+def test_messages_are_dropped_after_max_retries(collection):
+    collection.fail_times = 2
+    writer = ChatMessageWriter(batch_size=10, flush_interval=60, max_pending=100, max_retries=1)
+
+    async def scenario():
+        await writer.add(message(0))
+        assert not await writer.flush()
+        assert not await writer.flush()
+
+    run_writer(writer, scenario)
+    assert writer.stats()["dropped"] == 1
+    assert writer.stats()["pending"] == 0
+
+
+def test_full_buffer_sheds_oldest_message(collection):
+    collection.fail_times = 10
+    writer = ChatMessageWriter(batch_size=10, flush_interval=60, max_pending=2, max_retries=100)
+
+    async def scenario():
+        for i in range(3):
+            await writer.add(message(i))
+        assert [doc["id"] for doc in writer._pending] == ["1", "2"]
+
+    run_writer(writer, scenario)
+    assert writer.stats()["dropped"] == 1
+
+
+def test_close_flushes_pending_messages(collection):
+    writer = ChatMessageWriter(batch_size=10, flush_interval=60, max_pending=100, max_retries=3)
+
+    async def scenario():
+        await writer.add(message(0))
+
+    run_writer(writer, scenario)
+    assert [doc["id"] for doc in collection.docs] == ["0"]
@@ -0,0 +1,27 @@
+import pytest
+
+from server import is_follow_up
+
+
+@pytest.mark.parametrize("message", [
+    "What is PM-KISAN scheme?",
+    "How do I grow ginger in clay soil?",
+    "Which pesticide should I use for mealybug on tapioca?",
+    "പിഎം-കിസാൻ പദ്ധതി എന്താണ്?",
+    "വാഴയിലെ ഇലപ്പുള്ളി രോഗം എങ്ങനെ നിയന്ത്രിക്കാം?",
+])
+def test_standalone_questions(message):
+    assert not is_follow_up(message)
+
+
+@pytest.mark.parametrize("message", [
+    "How much?",
+    "And for paddy?",
+    "What about coconut trees?",
+    "How often should I spray it?",
+    "Can I use the same dose for chilli?",
+    "അതിന് എത്ര വളം വേണം?",
+    "ഇതിന്റെ വില എത്രയാണ്?",
+])
+def test_follow_ups(message):
+    assert is_follow_up(message)
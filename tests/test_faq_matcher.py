@@ -0,0 +1,44 @@
+import pytest
+
+from server import FAQ_DATA, FAQ_MATCH_MAX_NEW_WORDS, FAQ_MATCH_THRESHOLD, FAQMatcher
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return FAQMatcher(FAQ_DATA)
+
+
+def match(matcher, message, language="english"):
+    return matcher.match(message, language, FAQ_MATCH_THRESHOLD, FAQ_MATCH_MAX_NEW_WORDS)
+
+
+def answer(language, faq_id):
+    return next(item["answer"] for item in FAQ_DATA[language] if item["id"] == faq_id)
+
+
+@pytest.mark.parametrize("message, language, faq_id", [
+    ("How to manage pest attacks on crops?", "english", "2"),
+    ("how to manage pest attack on crops", "english", "2"),
+    ("What are the best fertilizer for my crops", "english", "3"),
+    ("How do I identify and treat plant diseases?", "english", "4"),
+    ("Which government schemes are available to farmers?", "english", "1"),
+    ("വിളയിലെ കീട ആക്രമണം എങ്ങനെ നിയന്ത്രിക്കാം?", "malayalam", "2"),
+    ("കർഷകർക്കുള്ള സർക്കാർ പദ്ധതികൾ എന്തൊക്കെ", "malayalam", "1"),
+])
+def test_rephrasings_match(matcher, message, language, faq_id):
+    assert match(matcher, message, language) == answer(language, faq_id)
+
+
+@pytest.mark.parametrize("message, language", [
+    ("How to manage pest attacks on rice?", "english"),
+    ("What are the best fertilizers for my banana crop?", "english"),
+    ("What government schemes are available for women farmers?", "english"),
+    ("നെല്ലിലെ കീട ആക്രമണം എങ്ങനെ നിയന്ത്രിക്കാം?", "malayalam"),
+    ("How much neem oil should I spray per acre?", "english"),
+])
+def test_more_specific_questions_do_not_match(matcher, message, language):
+    assert match(matcher, message, language) is None
+
+
+def test_answers_in_the_askers_language(matcher):
+    assert match(matcher, "How to manage pest attacks on crops?", "malayalam") == answer("malayalam", "2")
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import pytest
+
+from server import FAQ_DATA, FAQStore, choose_encoding
+
+
+@pytest.mark.parametrize("header, available, expected", [
+    ("gzip, deflate, br", ["br", "gzip"], "br"),
+    ("gzip", ["br", "gzip"], "gzip"),
+    ("br;q=0, gzip", ["br", "gzip"], "gzip"),
+    ("gzip;q=0.5, br;q=0.8", ["br", "gzip"], "br"),
+    ("gzip;q=1.0, br;q=0.2", ["br", "gzip"], "gzip"),
+    ("gzip;q=0", ["br", "gzip"], None),
+    ("*", ["br", "gzip"], "br"),
+    ("*;q=0, gzip", ["br", "gzip"], "gzip"),
+    ("", ["br", "gzip"], None),
+    ("br", ["gzip"], None),
+    ("x-gzip-ish", ["gzip"], None),
+])
+def test_choose_encoding(header, available, expected):
+    assert choose_encoding(header, available) == expected
+
+
+def make_store(tmp_path, data):
+    path = tmp_path / "faq.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    store = FAQStore("file", path)
+    store.load(FAQ_DATA)
+    return store
+
+
+@pytest.mark.parametrize("data", [{}, {"english": []}, {"english": [{"id": "1"}]}])
+def test_invalid_source_keeps_last_good_faq(tmp_path, data):
+    store = make_store(tmp_path, data)
+    payloads = store.payloads
+    assert not asyncio.run(store.reload())
+    assert store.data == FAQ_DATA
+    assert store.payloads is payloads
+    assert store.match("How to manage pest attacks on crops?", "english") is not None
+
+
+def test_valid_source_replaces_faq(tmp_path):
+    data = {"english": [{"id": "1", "question": "When to plant paddy?", "answer": "June."}]}
+    store = make_store(tmp_path, data)
+    assert asyncio.run(store.reload())
+    assert store.data == data
+    assert set(store.payloads) == {"english"}
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from server import KNOWLEDGE_BIGRAM_PREFIX, KnowledgeIndex, load_knowledge_chunks
+
+
+@pytest.fixture(scope="module")
+def index():
+    return KnowledgeIndex(load_knowledge_chunks())
+
+
+def top(index, query):
+    return index.search(query, 1)[0]["text"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What is PM-KISAN?", "PM-KISAN"),
+    ("പിഎം-കിസാൻ പദ്ധതി എന്താണ്?", "PM-KISAN"),
+    ("How much neem oil per acre for aphids on brinjal?", "Neem oil"),
+    ("വേപ്പെണ്ണ എത്ര തളിക്കണം?", "Neem oil"),
+])
+def test_ranks_the_matching_chunk_first(index, query, expected):
+    assert expected in top(index, query)
+
+
+def test_unrelated_query_returns_nothing(index):
+    assert index.search("zzz qqq", 4) == []
+
+
+def test_question_words_do_not_add_terms(index):
+    assert index.query_terms("എന്താണ് എത്ര എങ്ങനെ?") == set()
+
+
+def test_inflected_malayalam_falls_back_to_a_few_bigrams(index):
+    terms = index.query_terms("വഴുതനയിലെ")
+    assert terms and all(term.startswith(KNOWLEDGE_BIGRAM_PREFIX) for term in terms)
+    assert len(terms) <= 2
+
+
+def test_bigrams_common_to_most_chunks_are_not_indexed():
+    chunks = [{"section": "s", "text": f"വിളകൾ {word}"} for word in ("നെല്ല്", "വാഴ", "തെങ്ങ്", "കുരുമുളക്")]
+    index = KnowledgeIndex(chunks)
+    assert KNOWLEDGE_BIGRAM_PREFIX + "കൾ" not in index._postings
+    assert "വിളകൾ" in index._postings
+
+
+def test_malayalam_lookup_stays_fast_on_thousands_of_chunks():
+    chunks = load_knowledge_chunks()
+    big = [dict(chunk, text=f"{chunk['text']} {i}") for i in range(300) for chunk in chunks]
+    index = KnowledgeIndex(big)
+    query = "വഴുതനയിലെ മൺകീടത്തിന് ഏക്കറിന് എത്ര വേപ്പെണ്ണ തളിക്കണം?"
+    start = time.perf_counter()
+    for _ in range(20):
+        results = index.search(query, 4)
+    elapsed = (time.perf_counter() - start) / 20
+    assert "Neem oil" in results[0]["text"]
+    # Well above the ~1 ms this takes locally, so slow CI machines don't flake
+    assert elapsed < 0.02
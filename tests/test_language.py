@@ -0,0 +1,40 @@
+import pytest
+
+from server import LANGUAGE_SAMPLE_CHARS, LanguageDecision, detect_language
+
+
+@pytest.mark.parametrize("message", ["൧൦ൻ", "ാിീ", "൧൦"])
+def test_signs_digits_and_chillu_alone_are_malayalam(message):
+    assert detect_language(message) == LanguageDecision("malayalam", 1.0, 1.0)
+
+
+def test_malayalam_only_after_the_sample_still_routes_to_malayalam():
+    decision = detect_language("a" * LANGUAGE_SAMPLE_CHARS + "വളം")
+    assert decision.language == "malayalam"
+    assert 0 < decision.malayalam_ratio < 0.01
+
+
+def test_long_non_ascii_text_without_malayalam_is_english():
+    assert detect_language("é" + "a" * (LANGUAGE_SAMPLE_CHARS * 2)) == LanguageDecision("english", 1.0, 0.0)
+
+
+@pytest.mark.parametrize("message, requested, expected", [
+    ("What is PM-KISAN?", "english", LanguageDecision("english", 1.0, 0.0)),
+    ("What is PM-KISAN?", "malayalam", LanguageDecision("malayalam", 0.5, 0.0)),
+    ("What is PM-KISAN?", "Malayalam", LanguageDecision("malayalam", 0.5, 0.0)),
+    ("12345?", "english", LanguageDecision("english", 0.5, 0.0)),
+])
+def test_ascii_messages(message, requested, expected):
+    assert detect_language(message, requested) == expected
+
+
+@pytest.mark.parametrize("message, requested, confidence, ratio", [
+    # 3 Malayalam characters against 4 Latin letters
+    ("neem വളം", "english", 0.4286, 0.4286),
+    # A Malayalam preference never reports less than even odds
+    ("neem വളം", "malayalam", 0.5, 0.4286),
+    ("വളം a", "english", 0.75, 0.75),
+    ("വളം a", "malayalam", 0.75, 0.75),
+])
+def test_mixed_text_ratio_and_confidence(message, requested, confidence, ratio):
+    assert detect_language(message, requested) == LanguageDecision("malayalam", confidence, ratio)
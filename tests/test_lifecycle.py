@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from server import Lifecycle
+
+
+def test_drain_waits_for_in_flight_chats_and_refuses_new_ones():
+    async def scenario():
+        lifecycle = Lifecycle()
+        lifecycle.ready = True
+        finished = asyncio.Event()
+
+        async def chat():
+            async with lifecycle.track_chat():
+                await finished.wait()
+
+        in_flight = asyncio.create_task(chat())
+        await asyncio.sleep(0)
+        drain = asyncio.create_task(lifecycle.drain(1))
+        await asyncio.sleep(0)
+        assert not lifecycle.ready and lifecycle.draining
+        with pytest.raises(HTTPException) as excinfo:
+            async with lifecycle.track_chat():
+                pass
+        assert excinfo.value.status_code == 503
+        assert not drain.done()
+
+        finished.set()
+        await asyncio.wait_for(drain, 1)
+        await in_flight
+        assert lifecycle.active_chats == 0
+
+    asyncio.run(scenario())
+
+
+def test_drain_gives_up_after_timeout():
+    async def scenario():
+        lifecycle = Lifecycle()
+        async with lifecycle.track_chat():
+            await lifecycle.drain(0.01)
+            assert lifecycle.active_chats == 1
+
+    asyncio.run(scenario())
+
+
+def test_reset_starts_a_fresh_cycle():
+    lifecycle = Lifecycle()
+    lifecycle.ready, lifecycle.draining = True, True
+    lifecycle.reset()
+    assert not lifecycle.ready and not lifecycle.draining and lifecycle.active_chats == 0
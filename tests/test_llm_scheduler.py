@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from server import LLMOverloaded, LLMScheduler
+
+
+def make_scheduler(max_concurrency=2, max_queue=10, queue_timeout=1.0, max_pending_per_session=4):
+    return LLMScheduler(max_concurrency, max_queue, queue_timeout, max_pending_per_session)
+
+
+def test_identical_calls_are_coalesced():
+    async def scenario():
+        scheduler = make_scheduler()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(scheduler.run("q", f"s{i}", call) for i in range(3)))
+        assert results == ["answer"] * 3
+        assert len(calls) == 1
+        assert scheduler.stats()["coalesced"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_first_caller_does_not_cancel_coalesced_callers():
+    async def scenario():
+        scheduler = make_scheduler()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.create_task(scheduler.run("q", "a", call))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(scheduler.run("q", "b", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert scheduler.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_call_is_cancelled_once_every_caller_leaves():
+    async def scenario():
+        scheduler = make_scheduler()
+        cancelled = asyncio.Event()
+
+        async def call():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(scheduler.run("q", f"s{i}", call)) for i in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert scheduler.stats()["active"] == 0
+        assert not scheduler._inflight and not scheduler._pending
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_coalesced_caller():
+    async def scenario():
+        scheduler = make_scheduler()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            *(scheduler.run("q", f"s{i}", call) for i in range(2)), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_per_session_pending_limit():
+    async def scenario():
+        scheduler = make_scheduler(max_pending_per_session=1)
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.create_task(scheduler.run("q1", "s", call))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded) as excinfo:
+            await scheduler.run("q2", "s", call)
+        assert excinfo.value.status_code == 429
+        release.set()
+        assert await first == "answer"
+
+    asyncio.run(scenario())
+
+
+def test_queue_is_served_round_robin_across_sessions():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=1)
+        order = []
+
+        def make_call(label):
+            async def call():
+                order.append(label)
+                await asyncio.sleep(0.01)
+                return label
+            return call
+
+        tasks = [asyncio.create_task(scheduler.run("busy", "x", make_call("busy")))]
+        await asyncio.sleep(0)
+        for key, session in [("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b")]:
+            tasks.append(asyncio.create_task(scheduler.run(key, session, make_call(key))))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["busy", "a1", "b1", "a2", "a3"]
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_returns_503():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=1, queue_timeout=0.01)
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.create_task(scheduler.run("q1", "a", call))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded) as excinfo:
+            await scheduler.run("q2", "b", call)
+        assert excinfo.value.status_code == 503
+        release.set()
+        await first
+
+    asyncio.run(scenario())
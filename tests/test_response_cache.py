@@ -0,0 +1,50 @@
+import asyncio
+
+from server import ResponseCache
+
+
+def make_cache(max_entries=100, ttl_seconds=3600):
+    return ResponseCache(max_entries, ttl_seconds, similarity=0.9, use_mongo=False)
+
+
+def test_exact_and_near_duplicate_hits():
+    async def scenario():
+        cache = make_cache()
+        await cache.set("english", "How do I manage pests on my banana plants?", "answer")
+        assert await cache.get("english", "how do I manage pests on my banana plants") == "answer"
+        assert await cache.get("english", "How do I manage pest on my banana plants?") == "answer"
+        assert await cache.get("malayalam", "How do I manage pests on my banana plants?") is None
+        assert cache.stats()["fuzzy_hits"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_different_numbers_never_fuzzy_match():
+    async def scenario():
+        cache = make_cache()
+        await cache.set("english", "How do I grow variety 12 of paddy?", "answer")
+        assert await cache.get("english", "How do I grow variety 13 of paddy?") is None
+
+    asyncio.run(scenario())
+
+
+def test_near_duplicate_found_among_many_similar_entries():
+    async def scenario():
+        cache = make_cache(max_entries=1000)
+        for i in range(1000):
+            await cache.set("english", f"How do I manage pests in season {i} near my farm", str(i))
+        assert await cache.get("english", "How do i manage pest in season 437 near my farm") == "437"
+
+    asyncio.run(scenario())
+
+
+def test_eviction_removes_index_entries():
+    async def scenario():
+        cache = make_cache(max_entries=2)
+        for question in ["How to grow ginger?", "How to grow okra?", "How to grow pepper?"]:
+            await cache.set("english", question, question)
+        assert await cache.get("english", "How to grow ginger?") is None
+        indexed = {key for keys in cache._postings.values() for key in keys}
+        assert indexed == set(cache._entries)
+
+    asyncio.run(scenario())
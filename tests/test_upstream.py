@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+import server
+from server import CircuitBreaker, CircuitOpen, RetryBudget
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setattr(server, "llm_breaker", CircuitBreaker(failure_threshold=2, reset_seconds=0.05))
+    monkeypatch.setattr(server, "llm_retry_budget", RetryBudget(ratio=0.1, max_tokens=10))
+    monkeypatch.setattr(server, "LLM_CALL_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(server, "LLM_DEADLINE_SECONDS", 1.0)
+    monkeypatch.setattr(server, "LLM_MAX_RETRIES", 1)
+    monkeypatch.setattr(server, "LLM_RETRY_BASE_DELAY_SECONDS", 0.001)
+    return server
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    breaker.record_failure()
+    asyncio.run(asyncio.sleep(0.02))
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 2
+
+
+def test_cancelled_probe_lets_next_call_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, max_tokens=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+    assert budget.stats()["exhausted"] == 1
+
+
+def test_send_with_retries_retries_after_timeout(upstream):
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return "answer"
+
+    assert asyncio.run(upstream.send_with_retries(send)) == "answer"
+    assert len(attempts) == 2
+    assert upstream.llm_breaker.state == "closed"
+
+
+def test_send_with_retries_fails_fast_once_breaker_opens(upstream):
+    async def send():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(upstream.send_with_retries(send))
+    assert upstream.llm_breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        asyncio.run(upstream.send_with_retries(send))